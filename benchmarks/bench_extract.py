@@ -0,0 +1,62 @@
+"""
+Micro-benchmark: code-block extraction over a large completion corpus.
+
+Compares the old multi-pass `re.findall` extractor (copied from the coverage scripts)
+with the single-pass extractor in code_extract.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_extract [--copies 2000]
+"""
+import argparse
+import glob
+import json
+import re
+import time
+
+from code_extract import extract_code
+
+def legacy_extract_final_code(completion_text: str) -> str:
+    """The extractor the coverage scripts used before code_extract."""
+    code_blocks = re.findall(r"```(python|Python)\n(.*?)```", completion_text, re.DOTALL)
+    if code_blocks:
+        return code_blocks[-1][1]
+    code_blocks = re.findall(r"```\n(.*?)\n```", completion_text, re.DOTALL)
+    if code_blocks:
+        return code_blocks[-1]
+    if "def " in completion_text and "```" not in completion_text:
+        return completion_text
+    return ""
+
+def load_corpus(copies: int) -> list:
+    completions = []
+    for filename in sorted(glob.glob("*.jsonl") + glob.glob("results/*.jsonl")):
+        with open(filename, 'r', encoding='utf-8') as f:
+            for line in f:
+                completion = json.loads(line).get("completion")
+                if isinstance(completion, str):
+                    completions.append(completion)
+    return completions * copies
+
+def bench(name: str, func, corpus: list, corpus_mb: float):
+    start = time.perf_counter()
+    for text in corpus:
+        func(text)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<28} {elapsed:8.3f}s  {corpus_mb / elapsed:8.1f} MB/s  {len(corpus) / elapsed:10.0f} completions/s")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark code-block extraction.")
+    parser.add_argument("--copies", type=int, default=2000, help="How many times to repeat the bundled completions.")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.copies)
+    corpus_mb = sum(len(text.encode("utf-8")) for text in corpus) / 1e6
+    print(f"Corpus: {len(corpus)} completions, {corpus_mb:.1f} MB\n")
+
+    bench("legacy (multi-pass findall)", legacy_extract_final_code, corpus, corpus_mb)
+    for policy in ("last", "first", "longest"):
+        bench(f"code_extract policy={policy}", lambda text: extract_code(text, policy=policy), corpus, corpus_mb)
+    bench("code_extract policy=def", lambda text: extract_code(text, policy="def", target="add"), corpus, corpus_mb)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Benchmark: src.solutions.fib against the original O(n) loop.
+
+Times single large indices (up to the millions), repeated queries with the memo,
+and a batch of indices through fib_many versus one fib() call per index.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_fib [--max_n 5000000] [--skip_loop_above 300000]
+"""
+import argparse
+import random
+import time
+
+from src.solutions import fib, fib_many
+
+def loop_fib(n: int) -> int:
+    """The original implementation, kept here as the baseline."""
+    if n == 0:
+        return 0
+    a, b = 0, 1
+    for _ in range(2, n + 1):
+        a, b = b, a + b
+    return b
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark fib implementations.")
+    parser.add_argument("--max_n", type=int, default=5_000_000, help="Largest single index to time.")
+    parser.add_argument("--skip_loop_above", type=int, default=300_000, help="Do not run the O(n) loop beyond this index.")
+    args = parser.parse_args()
+
+    print(f"{'n':>10} {'loop':>10} {'doubling':>10}")
+    n = 1000
+    while n <= args.max_n:
+        fast, fast_s = timed(fib, n)
+        if n <= args.skip_loop_above:
+            slow, slow_s = timed(loop_fib, n)
+            assert slow == fast
+            loop_col = f"{slow_s * 1000:8.1f}ms"
+        else:
+            loop_col = f"{'skipped':>10}"
+        print(f"{n:>10} {loop_col} {fast_s * 1000:8.1f}ms")
+        n *= 4
+
+    queries = [random.randrange(100_000) for _ in range(50)] * 20
+    _, plain_s = timed(lambda: [fib(q) for q in queries])
+    _, memo_s = timed(lambda: [fib(q, memo=True) for q in queries])
+    print(f"\n{len(queries)} repeated queries: plain {plain_s * 1000:.1f}ms, memo {memo_s * 1000:.1f}ms")
+
+    batch = sorted(random.sample(range(200_000), 2000))
+    single, single_s = timed(lambda: [fib(i) for i in batch])
+    many, many_s = timed(fib_many, batch)
+    assert single == many
+    print(f"{len(batch)} indices below 200000: one call each {single_s * 1000:.1f}ms, fib_many {many_s * 1000:.1f}ms")
+
+if __name__ == "__main__":
+    main()
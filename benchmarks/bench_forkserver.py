@@ -0,0 +1,77 @@
+"""
+Benchmark: per-sample startup latency of the sandbox strategies.
+
+Compares starting a fresh interpreter per sample (the old `pytest` subprocess and
+a bare `python -c`) with forking a child from a warm process (forkserver), and
+reports per-sample latency for SandboxPool with and without fork-per-sample.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_forkserver [--runs 20]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import evaluate
+import forkserver
+
+SAMPLE_CODE = "def add(a, b):\n    return a + b\n"
+SAMPLE_TEST = "assert add(2, 3) == 5\n"
+
+def time_runs(fn, runs: int) -> list:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+def report(label: str, timings: list):
+    print(f"{label:<34} median {statistics.median(timings):8.2f} ms   mean {statistics.mean(timings):8.2f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sandbox startup latency.")
+    parser.add_argument("--runs", type=int, default=20, help="Samples per strategy.")
+    args = parser.parse_args()
+
+    if not forkserver.FORK_AVAILABLE:
+        print("os.fork is not available on this platform; nothing to compare.")
+        return
+
+    with tempfile.TemporaryDirectory() as workdir:
+        test_file = os.path.join(workdir, "test_sample.py")
+        with open(test_file, "w") as f:
+            f.write(SAMPLE_CODE + "\ndef test_sample():\n    " + SAMPLE_TEST)
+
+        report("subprocess pytest", time_runs(
+            lambda: subprocess.run([sys.executable, "-m", "pytest", "-q", test_file],
+                                   capture_output=True, cwd=workdir),
+            args.runs))
+
+    report("subprocess python -c", time_runs(
+        lambda: subprocess.run([sys.executable, "-c", "pass"], capture_output=True),
+        args.runs))
+
+    forkserver.preload()
+    report("fork from warm process", time_runs(
+        lambda: forkserver.run_forked(evaluate._run_sample, (SAMPLE_CODE, SAMPLE_TEST)),
+        args.runs))
+
+    print()
+    jobs = [(SAMPLE_CODE, SAMPLE_TEST)] * (args.runs * 10)
+    for fork_per_sample in (False, True):
+        with evaluate.SandboxPool(workers=1, fork_per_sample=fork_per_sample) as pool:
+            pool.map(jobs[:1])  # start-up is not part of the per-sample cost
+            start = time.perf_counter()
+            outcomes = pool.map(jobs)
+            elapsed = (time.perf_counter() - start) * 1000
+        assert all(status == "passed" for status, _ in outcomes)
+        label = "SandboxPool, fork per sample" if fork_per_sample else "SandboxPool, shared worker"
+        print(f"{label:<34} {elapsed / len(jobs):8.2f} ms/sample")
+
+if __name__ == "__main__":
+    main()
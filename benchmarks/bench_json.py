@@ -0,0 +1,54 @@
+"""
+Benchmark: JSONL read and write throughput for each serialization backend.
+
+Uses the records in results/*.jsonl, repeated until the corpus is large enough
+to time, and reports MB/s for jsonl_io.iter_jsonl and jsonl_io.write_jsonl.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_json [--copies 2000]
+"""
+import argparse
+import glob
+import os
+import tempfile
+import time
+
+import jsonl_io
+
+def load_records(copies: int) -> list:
+    records = []
+    for filename in sorted(glob.glob("results/*.jsonl")):
+        records.extend(jsonl_io.iter_jsonl(filename))
+    return records * copies
+
+def bench_backend(backend: str, records: list, path: str):
+    jsonl_io.use_backend(backend)
+
+    start = time.perf_counter()
+    jsonl_io.write_jsonl(path, records)
+    write_s = time.perf_counter() - start
+    size_mb = os.path.getsize(path) / 1e6
+
+    start = time.perf_counter()
+    count = sum(1 for _ in jsonl_io.iter_jsonl(path))
+    read_s = time.perf_counter() - start
+    assert count == len(records)
+
+    print(f"{backend:<8} {size_mb:8.1f} MB   write {size_mb / write_s:8.1f} MB/s   read {size_mb / read_s:8.1f} MB/s")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark JSONL serialization backends.")
+    parser.add_argument("--copies", type=int, default=2000, help="How many times to repeat the records in results/*.jsonl.")
+    args = parser.parse_args()
+
+    records = load_records(args.copies)
+    print(f"Corpus: {len(records)} records\n")
+    backends = ["json"] + (["orjson"] if jsonl_io.orjson is not None else [])
+    with tempfile.TemporaryDirectory() as workdir:
+        for backend in backends:
+            bench_backend(backend, records, os.path.join(workdir, f"{backend}.jsonl"))
+    if jsonl_io.orjson is None:
+        print("\norjson is not installed; only the stdlib backend was measured (pip install orjson).")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Benchmark: src.solutions.is_palindrome against the original implementation.
+
+Times multi-megabyte texts (a palindrome, which must be scanned completely, and
+a near-miss that differs at the ends) and a large batch of short strings.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_palindrome [--mb 8] [--short 1000000]
+"""
+import argparse
+import random
+import re
+import time
+
+from src.solutions import is_palindrome, is_palindrome_many
+
+def original_is_palindrome(s) -> bool:
+    """The original implementation, kept here as the baseline."""
+    if not isinstance(s, str):
+        return False
+    s = s.lower().replace(" ", "")
+    s = re.sub(r'[^\w]', '', s)
+    return s == s[::-1]
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+def compare(label: str, baseline, current, arg):
+    expected, baseline_s = timed(baseline, arg)
+    result, current_s = timed(current, arg)
+    assert result == expected
+    print(f"{label:<32} original {baseline_s * 1000:9.1f}ms   current {current_s * 1000:9.1f}ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark is_palindrome.")
+    parser.add_argument("--mb", type=int, default=8, help="Size of the long texts in MB.")
+    parser.add_argument("--short", type=int, default=1_000_000, help="Number of short strings in the batch.")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    half = "".join(rng.choice("abcXYZ ,.'_09") for _ in range(args.mb * 500_000))
+    palindrome = half + half[::-1]
+    near_miss = "x" + palindrome[1:]
+    unicode_palindrome = half + "é" + half[::-1]
+
+    compare(f"{args.mb} MB ASCII palindrome", original_is_palindrome, is_palindrome, palindrome)
+    compare(f"{args.mb} MB ASCII near miss", original_is_palindrome, is_palindrome, near_miss)
+    compare(f"{args.mb} MB non-ASCII palindrome", original_is_palindrome, is_palindrome, unicode_palindrome)
+
+    words = ["Race car", "Madam, I'm Adam", "hello", "A man, a plan", "abba", "Never odd or even"]
+    batch = [rng.choice(words) for _ in range(args.short)]
+    compare(f"{args.short} short strings",
+            lambda items: [original_is_palindrome(s) for s in items], is_palindrome_many, batch)
+
+if __name__ == "__main__":
+    main()
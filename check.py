@@ -1,5 +1,4 @@
-import jsonlines
+from jsonl_io import iter_jsonl
 
-with jsonlines.open("results/llama3_cot.jsonl") as reader:
-    for i, record in enumerate(reader):
-        print(f"{record['task_id']}:\n{record['completion']}\n{'-'*50}")
+for i, record in enumerate(iter_jsonl("results/llama3_cot.jsonl")):
+    print(f"{record['task_id']}:\n{record['completion']}\n{'-'*50}")
@@ -0,0 +1,85 @@
+import re
+from functools import lru_cache
+from typing import List, NamedTuple, Optional
+
+# Every ``` fence with its info string. All blocks are found in one finditer pass over
+# the completion; the walk below pairs the fences into opening/closing pairs.
+_FENCE = re.compile(r"```([^\n`]*)")
+_PYTHON_TAGS = {"python", "python3", "py"}
+
+POLICIES = ("first", "last", "longest", "def")
+
+class CodeBlock(NamedTuple):
+    language: str   # lower-cased info string, "" for a bare ``` fence
+    code: str
+    start: int      # offset of the opening fence in the completion
+
+def find_code_blocks(completion_text: str) -> List[CodeBlock]:
+    """Returns every fenced code block in the completion, in order."""
+    blocks = []
+    language = None  # info string of the open block, None while outside a block
+    for match in _FENCE.finditer(completion_text):
+        tag = match.group(1).strip().lower()
+        opens_line = completion_text.startswith("\n", match.end())
+        # A ```python fence always starts a new block, which recovers from stray
+        # closing fences that LLMs like to leave in front of the real code
+        if language is None or (tag in _PYTHON_TAGS and opens_line):
+            if opens_line:
+                language, opened_at, body_start = tag, match.start(), match.end() + 1
+            continue
+        blocks.append(CodeBlock(language, completion_text[body_start:match.start()], opened_at))
+        language = None
+    return blocks
+
+@lru_cache(maxsize=256)
+def _def_pattern(name: str) -> re.Pattern:
+    return re.compile(rf"^[ \t]*(?:async[ \t]+)?def[ \t]+{re.escape(name)}[ \t]*\(", re.MULTILINE)
+
+def _defines(code: str, name: str) -> bool:
+    return name in code and _def_pattern(name).search(code) is not None
+
+def extract_code(completion_text: str, policy: str = "last", target: Optional[str] = None,
+                 fallback: Optional[str] = "def") -> str:
+    """
+    Picks one code block from a completion.
+    Python-tagged blocks are preferred; bare ``` blocks are used only if there are none,
+    and blocks tagged with other languages are ignored.
+
+    policy:   "first", "last", "longest", or "def" (the last block that defines `target`,
+              falling back to "last" if none does).
+    fallback: what to return when there is no usable block. "def" returns the whole
+              completion if it contains a def and no fences, "raw" returns the whole
+              completion, None returns "".
+    """
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown extraction policy: {policy!r} (expected one of {POLICIES})")
+
+    blocks = find_code_blocks(completion_text)
+    candidates = [b for b in blocks if b.language in _PYTHON_TAGS] or [b for b in blocks if not b.language]
+
+    if candidates:
+        if policy == "first":
+            return candidates[0].code
+        if policy == "longest":
+            return max(candidates, key=lambda b: len(b.code)).code
+        if policy == "def" and target:
+            defining = [b for b in candidates if _defines(b.code, target)]
+            if defining:
+                return defining[-1].code
+        return candidates[-1].code
+
+    if fallback == "raw":
+        return completion_text
+    if fallback == "def" and "def " in completion_text and "```" not in completion_text:
+        return completion_text
+    return ""
+
+def extract_final_code(completion_text: str) -> str:
+    """
+    Extracts the *last* Python code block from the completion string.
+    This is designed to get the "final corrected function."
+    """
+    code = extract_code(completion_text, policy="last", fallback="def")
+    if not code:
+        print(f"Warning: Could not extract code from completion text: {completion_text[:50]}...")
+    return code
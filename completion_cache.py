@@ -0,0 +1,111 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# --- Configuration ---
+DEFAULT_CACHE_PATH = ".cache/completions.sqlite"
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+# ---------------------
+
+def cache_key(model, backend, prompt, params=None, seed=None, sample=0) -> str:
+    """
+    Content address for one completion: a hash of everything that decides the output.
+    `sample` is the index of the sample for the prompt, so n samples get n entries.
+    """
+    payload = json.dumps(
+        {
+            "model": model,
+            "backend": backend,
+            "prompt": prompt,
+            "params": params or {},
+            "seed": seed,
+            "sample": sample,
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class CompletionCache:
+    """
+    On-disk completion cache in a single SQLite file, bounded to max_bytes of
+    completion text. When the bound is exceeded the least recently used entries
+    are evicted. Safe to share between threads.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS completions ("
+            "key TEXT PRIMARY KEY, completion TEXT NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS completions_lru ON completions (last_used)")
+        self._db.commit()
+        self._bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM completions").fetchone()[0]
+
+    def get(self, key):
+        """Returns the cached completion for key, or None on a miss."""
+        with self._lock:
+            row = self._db.execute("SELECT completion FROM completions WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._db.execute("UPDATE completions SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+            return row[0]
+
+    def put(self, key, completion):
+        size = len(completion.encode("utf-8"))
+        with self._lock:
+            old = self._db.execute("SELECT size FROM completions WHERE key = ?", (key,)).fetchone()
+            if old is not None:
+                self._bytes -= old[0]
+            self._db.execute(
+                "INSERT OR REPLACE INTO completions (key, completion, size, last_used) VALUES (?, ?, ?, ?)",
+                (key, completion, size, time.time()),
+            )
+            self._bytes += size
+            self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        """Drops least recently used entries until the cache fits in max_bytes."""
+        while self._bytes > self.max_bytes:
+            rows = self._db.execute(
+                "SELECT key, size FROM completions ORDER BY last_used LIMIT 64"
+            ).fetchall()
+            if not rows:
+                self._bytes = 0
+                break
+            for key, size in rows:
+                self._db.execute("DELETE FROM completions WHERE key = ?", (key,))
+                self._bytes -= size
+                if self._bytes <= self.max_bytes:
+                    break
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "entries": entries,
+            "bytes": self._bytes,
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,147 @@
+import contextlib
+import hashlib
+import io
+import json
+import os
+import sys
+import tempfile
+import types
+
+import coverage
+import pytest
+
+from forkserver import call_forked
+from harness_cache import compile_test
+from import_resolver import inject_imports
+
+SOLUTION_MODULE = "temp_solution"
+# Bump when a change here can change measured results, so stored results are not reused
+ENGINE_VERSION = 3
+# Reported for a task that timed out or crashed; it is never stored, so the next run measures again
+UNMEASURED = (False, 0.0, 0.0, "")
+
+def work_unit_key(solution_code: str, test_asserts: str, extra_tests: tuple = ()) -> str:
+    """Hash of everything a coverage measurement depends on: the code and the tests."""
+    digest = hashlib.sha256()
+    for part in (solution_code, test_asserts, *(source for _, source in extra_tests)):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+def _run_extra_tests(extra_tests: tuple, workspace: str) -> bool:
+    """
+    Runs the extra test files under pytest, in this process, so coverage.py records
+    them like the asserts. Each source is written into the workspace first, so the
+    tests that run are exactly the ones the result is keyed by. Fixtures, parametrize
+    and test classes work as in the old pytest run. Returns True if every test passed.
+    """
+    test_root = os.path.join(workspace, "extra_tests")
+    paths = []
+    for index, (filename, source) in enumerate(extra_tests):
+        directory = os.path.join(test_root, str(index))
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, os.path.basename(filename))
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(source)
+        paths.append(path)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            exit_code = pytest.main(["-q", "-p", "no:cacheprovider", "--import-mode=importlib", *paths])
+    finally:
+        # pytest would otherwise reuse these modules the next time a file of the same name runs
+        for name, module in list(sys.modules.items()):
+            if (getattr(module, "__file__", None) or "").startswith(test_root + os.sep):
+                del sys.modules[name]
+    return exit_code == pytest.ExitCode.OK
+
+def measure_coverage(solution_code: str, test_asserts: str, solution_path: str,
+                     extra_tests: tuple = (), module_name: str = SOLUTION_MODULE, html_dir: str = None) -> tuple:
+    """
+    Runs a task's asserts (plus optional extra test files, given as (filename, source)
+    pairs) against the solution under coverage.py, in the current process.
+    Returns (passed, line %, branch %, missing lines) like the old pytest --cov run,
+    without starting pytest or writing a coverage.json report.
+    If html_dir is given, an HTML report is written there as well.
+    """
+    solution_path = os.path.abspath(solution_path)
+    # coverage.py reads the source back from disk when it analyses the file
+    with open(solution_path, 'w', encoding='utf-8') as f:
+        f.write(solution_code)
+
+    cov = coverage.Coverage(data_file=None, branch=True, include=[solution_path], config_file=False)
+    # A solution that fails before running any line is reported as 0%, not warned about
+    cov.set_option("run:disable_warnings", ["no-data-collected", "module-not-measured"])
+    module = types.ModuleType(module_name)
+    module.__file__ = solution_path
+    previous = sys.modules.get(module_name)
+    sys.modules[module_name] = module
+
+    tests_passed = True
+    cov.start()
+    try:
+        # Standard-library names the solution uses but forgot to import are provided
+        # up front, without editing its source (so line numbers stay the same)
+        inject_imports(module.__dict__, solution_code)
+        exec(compile(solution_code, solution_path, "exec"), module.__dict__)
+        # Same as `from temp_solution import *` at the top of the old test file
+        test_namespace = dict(module.__dict__)
+        inject_imports(test_namespace, test_asserts)
+        exec(compile_test(test_asserts), test_namespace)
+        if extra_tests:
+            tests_passed = _run_extra_tests(extra_tests, os.path.dirname(solution_path))
+    except (Exception, SystemExit):
+        tests_passed = False
+    finally:
+        cov.stop()
+        if previous is not None:
+            sys.modules[module_name] = previous
+        else:
+            sys.modules.pop(module_name, None)
+
+    line_coverage = 0.0
+    branch_coverage = 0.0
+    missing_lines = ""
+    try:
+        # The JSON report is the public way to get statement and branch totals together
+        report = io.StringIO()
+        with contextlib.redirect_stdout(report):
+            cov.json_report(outfile="-")
+        totals = json.loads(report.getvalue())["totals"]
+        if totals["num_statements"] > 0:
+            line_coverage = 100.0 * totals["covered_lines"] / totals["num_statements"]
+        if totals["num_branches"] > 0:
+            branch_coverage = 100.0 * totals["covered_branches"] / totals["num_branches"]
+        else:
+            branch_coverage = 100.0
+        missing_lines = cov.analysis2(solution_path)[4]
+        if html_dir:
+            cov.html_report(directory=html_dir)
+    except Exception as e:
+        # e.g. the solution does not parse, so coverage.py cannot analyse it
+        print(f"Could not analyse coverage for {solution_path}: {e}")
+
+    return tests_passed, round(line_coverage, 1), round(branch_coverage, 1), missing_lines
+
+def measure_in_workspace(solution_code: str, test_asserts: str, extra_tests: tuple = (), html_dir: str = None) -> tuple:
+    """
+    measure_coverage() inside a private temporary directory, so several tasks can be
+    measured at the same time (one per worker process) without sharing any files.
+    """
+    with tempfile.TemporaryDirectory(prefix="coverage_task_") as workspace:
+        solution_path = os.path.join(workspace, SOLUTION_MODULE + ".py")
+        return measure_coverage(solution_code, test_asserts, solution_path, extra_tests, html_dir=html_dir)
+
+def measure_isolated(solution_code: str, test_asserts: str, extra_tests: tuple = (), html_dir: str = None,
+                     timeout: float = None, cpu_seconds: int = None) -> tuple:
+    """
+    measure_in_workspace() in a forked child that is killed after `timeout` seconds
+    (wall clock) or `cpu_seconds` (RLIMIT_CPU). Returns None if the child timed out
+    or crashed, e.g. a solution that loops forever; callers report UNMEASURED for it
+    and do not store it, since the same code may finish on a less busy machine.
+    """
+    try:
+        return call_forked(measure_in_workspace, solution_code, test_asserts, extra_tests, html_dir,
+                           timeout=timeout, cpu_seconds=cpu_seconds)
+    except (TimeoutError, RuntimeError) as e:
+        print(f"Could not measure coverage: {e}")
+        return None
@@ -0,0 +1,393 @@
+"""
+Differential testing of completions against each task's canonical_solution.
+
+For every task, random inputs are generated from the type annotations of the
+canonical solution's signature, seeded with the literals found in the task's
+asserts. The canonical solution and each completion run on the same input
+batches in sandbox workers (evaluate.SandboxPool), and the first input on which
+a completion's result or exception type differs from the canonical one is
+reported. The canonical outputs of a batch are computed once and shared by
+every completion of that task.
+
+Usage:
+    python differential.py results/llama3_cot_cleaned.jsonl [--tasks_file tasks.jsonl] [--inputs 500]
+"""
+import argparse
+import ast
+import contextlib
+import copy
+import hashlib
+import io
+import json
+import math
+import os
+import random
+from typing import Callable, List, NamedTuple, Optional
+
+from code_extract import extract_code
+from evaluate import TIMEOUT_SECONDS, SandboxPool
+from jsonl_io import JsonlIndex, iter_jsonl
+
+# --- Configuration ---
+NUM_INPUTS = 500          # random inputs per task
+BATCH_SIZE = 100          # inputs run per sandbox job
+MAX_INT = 1000            # magnitude of random integers (literals from the asserts may be larger)
+MAX_LEN = 8               # length of random lists and strings
+REL_TOL = 1e-9            # float comparison tolerance
+ABS_TOL = 1e-9
+# ---------------------
+
+class Signature(NamedTuple):
+    name: str
+    annotations: list   # one annotation AST node (or None) per positional parameter
+
+def parse_signature(code: str) -> Optional[Signature]:
+    """Name and parameter annotations of the first top-level function in code."""
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return None
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            params = node.args.posonlyargs + node.args.args
+            return Signature(node.name, [param.annotation for param in params])
+    return None
+
+# --- Input generation ---
+
+def collect_literals(test_source: str) -> dict:
+    """Numbers and strings that appear in a task's asserts, used to seed the inputs."""
+    literals = {"int": set(), "float": set(), "str": set()}
+    try:
+        tree = ast.parse(test_source)
+    except SyntaxError:
+        return {kind: sorted(values) for kind, values in literals.items()}
+    for node in ast.walk(tree):
+        value = None
+        if isinstance(node, ast.Constant):
+            value = node.value
+        elif isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub) and isinstance(node.operand, ast.Constant):
+            if isinstance(node.operand.value, (int, float)):
+                value = -node.operand.value
+        if isinstance(value, bool) or value is None:
+            continue
+        if isinstance(value, int):
+            literals["int"].add(value)
+        elif isinstance(value, float):
+            literals["float"].add(value)
+        elif isinstance(value, str):
+            literals["str"].add(value)
+    return {kind: sorted(values, key=repr) for kind, values in literals.items()}
+
+def _type_name(node) -> Optional[str]:
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        return node.attr
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value  # string annotation, e.g. "int"
+    return None
+
+class InputGenerator:
+    """Builds random values for annotation AST nodes, biased towards the task's literals."""
+
+    def __init__(self, literals: dict, rng: random.Random):
+        self.literals = literals
+        self.rng = rng
+        chars = set("".join(literals["str"])) or set("abc")
+        self.alphabet = "".join(sorted(chars | set(" aZ09")))
+
+    def value(self, annotation) -> Callable[[], object]:
+        """Returns a function that draws one random value for the annotation."""
+        name = _type_name(annotation)
+        if name == "int":
+            return self.int_value
+        if name == "float":
+            return self.float_value
+        if name == "str":
+            return self.str_value
+        if name == "bool":
+            return lambda: self.rng.random() < 0.5
+        if name in ("list", "List", "Sequence", "Iterable"):
+            return lambda: [self.int_value() for _ in range(self.length())]
+
+        if isinstance(annotation, ast.Subscript):
+            outer = _type_name(annotation.value)
+            args = annotation.slice.elts if isinstance(annotation.slice, ast.Tuple) else [annotation.slice]
+            if outer in ("list", "List", "Sequence", "Iterable", "set", "Set", "frozenset"):
+                element = self.value(args[0])
+                make = list if outer not in ("set", "Set", "frozenset") else (frozenset if outer == "frozenset" else set)
+                return lambda: make(element() for _ in range(self.length()))
+            if outer in ("tuple", "Tuple"):
+                if len(args) == 2 and isinstance(args[1], ast.Constant) and args[1].value is Ellipsis:
+                    element = self.value(args[0])
+                    return lambda: tuple(element() for _ in range(self.length()))
+                elements = [self.value(arg) for arg in args]
+                return lambda: tuple(element() for element in elements)
+            if outer in ("dict", "Dict", "Mapping") and len(args) == 2:
+                key, val = self.value(args[0]), self.value(args[1])
+                return lambda: {key(): val() for _ in range(self.length())}
+            if outer == "Optional":
+                inner = self.value(args[0])
+                return lambda: None if self.rng.random() < 0.2 else inner()
+            if outer == "Union":
+                options = [self.value(arg) for arg in args]
+                return lambda: self.rng.choice(options)()
+        # Unannotated or unknown: a mix of the common scalar types
+        return lambda: self.rng.choice([self.int_value, self.str_value])()
+
+    def length(self) -> int:
+        return self.rng.randrange(MAX_LEN + 1)
+
+    def int_value(self) -> int:
+        roll = self.rng.random()
+        if self.literals["int"] and roll < 0.35:
+            return self.rng.choice(self.literals["int"]) + self.rng.choice([0, 0, -1, 1])
+        if roll < 0.7:
+            return self.rng.randint(-10, 10)
+        return self.rng.randint(-MAX_INT, MAX_INT)
+
+    def float_value(self) -> float:
+        roll = self.rng.random()
+        if self.literals["float"] and roll < 0.35:
+            return self.rng.choice(self.literals["float"]) * self.rng.choice([1, 1, -1, 0.5])
+        if roll < 0.5:
+            return float(self.rng.randint(-10, 10))
+        return round(self.rng.uniform(-MAX_INT, MAX_INT), self.rng.randrange(4))
+
+    def str_value(self) -> str:
+        roll = self.rng.random()
+        literals = self.literals["str"]
+        if literals and roll < 0.3:
+            return self.rng.choice(literals)
+        if literals and roll < 0.6:
+            # Mutate a literal: cut it, or join two of them
+            text = self.rng.choice(literals)
+            if self.rng.random() < 0.5:
+                i, j = sorted(self.rng.randrange(len(text) + 1) for _ in range(2))
+                return text[i:j]
+            return text + self.rng.choice(["", " "]) + self.rng.choice(literals)
+        return "".join(self.rng.choice(self.alphabet) for _ in range(self.length()))
+
+def generate_inputs(task: dict, signature: Signature, count: int, seed: int = 0) -> List[tuple]:
+    """count argument tuples for the task's function; the same seed gives the same inputs."""
+    rng = random.Random(f"{seed}:{task['task_id']}")
+    generator = InputGenerator(collect_literals(task.get("test", "")), rng)
+    draws = [generator.value(annotation) for annotation in signature.annotations]
+    return [tuple(draw() for draw in draws) for _ in range(count)]
+
+# --- Sandboxed execution ---
+
+def _normalize(value):
+    """Turns a result into plain picklable data that can be compared across processes."""
+    if value is None or isinstance(value, (bool, int, float, str, bytes)):
+        return value
+    if isinstance(value, (list, tuple)):
+        return type(value)(_normalize(v) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(_normalize(v) for v in value)
+    if isinstance(value, dict):
+        return {_normalize(k): _normalize(v) for k, v in value.items()}
+    return ("<repr>", repr(value))
+
+def _run_calls(code: str, name: str, inputs: list):
+    """
+    SandboxPool runner: defines the function from code and calls it on every input.
+    Returns ("passed", outputs) with ("ok", result) or ("raise", exception type) per
+    input, or ("failed", error) if the code does not even define the function.
+    """
+    namespace = {}
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            exec(code, namespace)
+        func = namespace[name]
+    except MemoryError:
+        return "memory_exceeded", "MemoryError"
+    except BaseException as e:
+        return "failed", f"{type(e).__name__}: {e}"
+
+    outputs = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for args in inputs:
+            try:
+                # Each call gets its own copy, so a function that mutates its input cannot affect the next one
+                outputs.append(("ok", _normalize(func(*copy.deepcopy(args)))))
+            except MemoryError:
+                return "memory_exceeded", "MemoryError"
+            except BaseException as e:
+                outputs.append(("raise", type(e).__name__))
+    return "passed", outputs
+
+# --- Comparison ---
+
+def same_result(expected, actual) -> bool:
+    """Equality with float tolerance; bools must stay bools, exceptions compare by type."""
+    if isinstance(expected, float) or isinstance(actual, float):
+        if isinstance(expected, bool) or isinstance(actual, bool):
+            return False
+        if not isinstance(expected, (int, float)) or not isinstance(actual, (int, float)):
+            return False
+        if math.isnan(expected) and math.isnan(actual):
+            return True
+        return math.isclose(expected, actual, rel_tol=REL_TOL, abs_tol=ABS_TOL)
+    if isinstance(expected, bool) != isinstance(actual, bool):
+        return False
+    if isinstance(expected, (list, tuple)) and isinstance(actual, (list, tuple)):
+        return (type(expected) is type(actual) and len(expected) == len(actual)
+                and all(same_result(e, a) for e, a in zip(expected, actual)))
+    if isinstance(expected, dict) and isinstance(actual, dict):
+        return expected.keys() == actual.keys() and all(same_result(v, actual[k]) for k, v in expected.items())
+    return type(expected) is type(actual) and expected == actual
+
+def _describe(outcome) -> str:
+    kind, value = outcome
+    return f"raises {value}" if kind == "raise" else repr(value)
+
+def first_divergence(inputs, expected, actual) -> Optional[dict]:
+    """The first input whose outcome differs, with its position in the batch."""
+    for index, (args, want, got) in enumerate(zip(inputs, expected, actual)):
+        if want[0] != got[0] or not same_result(want[1], got[1]):
+            return {"index": index, "input": repr(args), "expected": _describe(want), "actual": _describe(got)}
+    return None
+
+# --- Engine ---
+
+class DifferentialTester:
+    """
+    Checks completions against canonical solutions on shared random input batches.
+    Canonical outputs are cached per (canonical code, input batch), so each oracle
+    batch runs once no matter how many completions are checked against it.
+    """
+
+    def __init__(self, pool: SandboxPool, num_inputs=NUM_INPUTS, batch_size=BATCH_SIZE, seed=0):
+        self.pool = pool
+        self.num_inputs = num_inputs
+        self.batch_size = batch_size
+        self.seed = seed
+        self._oracle = {}   # batch digest -> canonical (status, outputs)
+        self._batches = {}  # task_id -> (signature, input batches)
+
+    def _task_batches(self, task):
+        if task["task_id"] not in self._batches:
+            signature = parse_signature(task["canonical_solution"])
+            inputs = generate_inputs(task, signature, self.num_inputs, self.seed) if signature else []
+            batches = [inputs[i:i + self.batch_size] for i in range(0, len(inputs), self.batch_size)]
+            self._batches[task["task_id"]] = (signature, batches)
+        return self._batches[task["task_id"]]
+
+    @staticmethod
+    def _digest(code, batch):
+        return hashlib.sha256((code + "\0" + repr(batch)).encode("utf-8")).hexdigest()
+
+    def _oracle_outputs(self, tasks):
+        """Runs every canonical batch that is not cached yet, all in one pool.map call."""
+        jobs, keys = [], []
+        for task in tasks:
+            signature, batches = self._task_batches(task)
+            for batch in batches:
+                key = self._digest(task["canonical_solution"], batch)
+                if key not in self._oracle and key not in keys:
+                    jobs.append((task["canonical_solution"], signature.name, batch))
+                    keys.append(key)
+        for key, outcome in zip(keys, self.pool.map(jobs)):
+            self._oracle[key] = outcome
+
+    def check(self, items):
+        """
+        items: (task, completion_code) pairs. Returns one report dict per item with
+        status "agree", "diverged", "timeout", "error", "oracle_error" or "skipped".
+        """
+        self._oracle_outputs({task["task_id"]: task for task, _ in items}.values())
+
+        reports = []
+        for task, _ in items:
+            signature, batches = self._task_batches(task)
+            report = {"task_id": task["task_id"], "status": "agree", "inputs_checked": 0}
+            if signature is None or not batches:
+                report.update(status="skipped", error="canonical_solution has no function to compare against")
+            reports.append(report)
+
+        oracle_errors = {}  # item index -> first error of the canonical solution
+        # One round per batch index; a completion that has already diverged, timed
+        # out or failed to load gets no more jobs
+        rounds = max((len(self._task_batches(task)[1]) for task, _ in items), default=0)
+        for batch_index in range(rounds):
+            jobs, owners = [], []
+            for index, (task, code) in enumerate(items):
+                signature, batches = self._task_batches(task)
+                if reports[index]["status"] != "agree" or batch_index >= len(batches):
+                    continue
+                batch = batches[batch_index]
+                oracle_status, oracle_value = self._oracle[self._digest(task["canonical_solution"], batch)]
+                if oracle_status != "passed":
+                    # The oracle itself timed out or crashed on this batch
+                    oracle_errors.setdefault(index, f"{oracle_status}: {oracle_value}")
+                    continue
+                jobs.append((code, signature.name, batch))
+                owners.append((index, batch))
+
+            for (index, batch), (status, actual) in zip(owners, self.pool.map(jobs)):
+                task, report = items[index][0], reports[index]
+                if status == "timeout":
+                    report.update(status="timeout", error=actual)
+                elif status != "passed":
+                    report.update(status="error", error=actual)
+                else:
+                    expected = self._oracle[self._digest(task["canonical_solution"], batch)][1]
+                    divergence = first_divergence(batch, expected, actual)
+                    if divergence:
+                        report["inputs_checked"] += divergence.pop("index") + 1
+                        report.update(status="diverged", first_divergence=divergence)
+                    else:
+                        report["inputs_checked"] += len(batch)
+
+        # Agreement needs at least one input the canonical solution actually answered
+        for index, report in enumerate(reports):
+            if report["status"] == "agree" and report["inputs_checked"] == 0:
+                report.update(status="oracle_error",
+                              error=oracle_errors.get(index, "canonical_solution produced no outputs"))
+        return reports
+
+def differential_test(generated_file, tasks_file, report_file=None, num_inputs=NUM_INPUTS, batch_size=BATCH_SIZE,
+                      seed=0, workers=1, timeout=TIMEOUT_SECONDS):
+    """Checks every completion in generated_file and returns the per-completion reports."""
+    items = []
+    with JsonlIndex(tasks_file) as tasks:
+        for record in iter_jsonl(generated_file):
+            task = tasks.get(record["task_id"])
+            if task is None or "canonical_solution" not in task:
+                print(f"Skipping {record['task_id']}: no canonical_solution in {tasks_file}.")
+                continue
+            items.append((task, extract_code(record["completion"], policy="last", fallback="raw")))
+
+    with SandboxPool(workers=workers, timeout=timeout, runner=_run_calls) as pool:
+        reports = DifferentialTester(pool, num_inputs, batch_size, seed).check(items)
+
+    counts = {}
+    for report in reports:
+        counts[report["status"]] = counts.get(report["status"], 0) + 1
+        if report["status"] == "diverged":
+            d = report["first_divergence"]
+            print(f"{report['task_id']}: diverged on {d['input']} (expected {d['expected']}, got {d['actual']})")
+    print(f"Checked {len(reports)} completion(s) on up to {num_inputs} inputs each: {counts}")
+
+    if report_file:
+        with open(report_file, "w") as f:
+            json.dump({"summary": counts, "results": reports}, f, indent=2)
+    return reports
+
+def main():
+    parser = argparse.ArgumentParser(description="Differential testing of completions against canonical solutions.")
+    parser.add_argument("generated_file", type=str, help="JSONL file with task_id and completion per line.")
+    parser.add_argument("--tasks_file", type=str, default="tasks.jsonl", help="Tasks with canonical_solution and test.")
+    parser.add_argument("--report_file", type=str, default=None, help="Where to write the JSON report.")
+    parser.add_argument("--inputs", type=int, default=NUM_INPUTS, help="Random inputs per task.")
+    parser.add_argument("--batch_size", type=int, default=BATCH_SIZE, help="Inputs per sandbox job.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for input generation.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Sandbox worker processes.")
+    args = parser.parse_args()
+    differential_test(args.generated_file, args.tasks_file, args.report_file, args.inputs, args.batch_size,
+                      args.seed, args.workers)
+
+if __name__ == "__main__":
+    main()
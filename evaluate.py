@@ -1,40 +1,296 @@
 import json
-import jsonlines
-import math
+import multiprocessing
+import multiprocessing.connection
+import numpy as np
+import os
+import signal
+import tempfile
+import time
+from collections import deque
+from itertools import islice
+from forkserver import FORK_AVAILABLE, MEMORY_EXIT_CODE, preload, run_forked, set_limits
+from harness_cache import compile_test
+from jsonl_io import JsonlIndex, dumps_line, iter_jsonl, loads
 
-def safe_exec(code, test):
+# --- Sandbox limits (per sample) ---
+TIMEOUT_SECONDS = 10.0          # wall-clock limit
+CPU_SECONDS = 10                # CPU-time limit (RLIMIT_CPU)
+MEMORY_BYTES = 1024 ** 3        # address-space limit (RLIMIT_AS)
+FORK_PER_SAMPLE = FORK_AVAILABLE  # run each sample in a fresh child forked from a warm worker
+# -----------------------------------
+
+def _run_sample(code, test):
+    """Runs one sample inside a sandbox worker and returns (status, error)."""
     try:
         local_env = {}
         exec(code, {}, local_env)
-        exec(test, {}, local_env)
-        return True, None
-    except Exception as e:
-        return False, str(e)
+        # The task's test block is compiled once and reused for every sample
+        exec(compile_test(test), {}, local_env)
+        return "passed", None
+    except MemoryError:
+        return "memory_exceeded", "MemoryError"
+    except (Exception, SystemExit) as e:
+        return "failed", str(e)
+
+def _outcome_for_exit(code):
+    """
+    Maps the exit code of a process that died without reporting to a (status, error) outcome.
+    Only a process that says it hit the memory limit counts as memory_exceeded; any other
+    signal (e.g. the kernel OOM killer, a segfault) is reported as crashed.
+    """
+    if code == -getattr(signal, "SIGXCPU", 24):
+        return "timeout", "CPU time limit exceeded"
+    if code == MEMORY_EXIT_CODE:
+        return "memory_exceeded", "MemoryError while reporting the result"
+    if code is not None and code < 0:
+        return "crashed", f"Worker was killed by signal {-code}"
+    return "failed", f"Worker exited with code {code}"
+
+def _run_forked_sample(job, timeout, cpu_seconds, memory_bytes, runner=_run_sample):
+    """Runs one sample in a child forked from this (warm) worker, with limits applied to the child only."""
+    status, value = run_forked(
+        runner, job, timeout=timeout,
+        setup=lambda: set_limits(cpu_seconds, memory_bytes),
+    )
+    if status == "ok":
+        return value
+    if status == "timeout":
+        return "timeout", f"Timed out after {timeout}s"
+    if status == "crashed":
+        return _outcome_for_exit(value)
+    return "failed", str(value)
+
+def _worker_main(conn, cpu_seconds, memory_bytes, fork_per_sample=False, timeout=None, runner=_run_sample):
+    """Sandbox worker loop: receives jobs, runs runner(*job) and sends back its (status, value)."""
+    if fork_per_sample:
+        # Warm worker: import once, then fork a fresh child per sample. Nothing a
+        # sample does (globals, monkeypatching, leaked memory) reaches the next one.
+        preload()
+    else:
+        set_limits(None, memory_bytes)
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+        try:
+            if fork_per_sample:
+                conn.send(_run_forked_sample(job, timeout, cpu_seconds, memory_bytes, runner))
+            else:
+                set_limits(cpu_seconds, None)
+                conn.send(runner(*job))
+        except MemoryError:
+            os._exit(MEMORY_EXIT_CODE)
+
+class SandboxPool:
+    """
+    A pool of killable worker processes for running untrusted samples.
+    Each sample gets a wall-clock timeout plus CPU and memory limits; a worker
+    that hangs, crashes or runs out of memory is killed and replaced.
+    With fork_per_sample each worker acts as a fork server: it preloads common
+    modules once and runs every sample in its own copy-on-write child.
+    Jobs are (code, test) pairs by default; pass a module-level `runner` to run
+    other jobs, as long as it returns a picklable (status, value) tuple.
+    """
+
+    def __init__(self, workers=1, timeout=TIMEOUT_SECONDS, cpu_seconds=CPU_SECONDS, memory_bytes=MEMORY_BYTES,
+                 fork_per_sample=FORK_PER_SAMPLE, runner=_run_sample):
+        self.timeout = timeout
+        self.runner = runner
+        self.cpu_seconds = cpu_seconds
+        self.memory_bytes = memory_bytes
+        self.fork_per_sample = fork_per_sample and FORK_AVAILABLE
+        self._ctx = multiprocessing.get_context()
+        if self.fork_per_sample:
+            preload()  # forked workers inherit the imports
+        self._workers = [self._spawn() for _ in range(max(1, workers))]
+
+    def _spawn(self):
+        parent_conn, child_conn = self._ctx.Pipe()
+        proc = self._ctx.Process(
+            target=_worker_main,
+            args=(child_conn, self.cpu_seconds, self.memory_bytes, self.fork_per_sample, self.timeout, self.runner),
+            daemon=True,
+        )
+        proc.start()
+        child_conn.close()
+        return proc, parent_conn
+
+    def _recycle(self, worker):
+        proc, conn = worker
+        if proc.is_alive():
+            proc.kill()
+        proc.join()
+        conn.close()
+        replacement = self._spawn()
+        self._workers[self._workers.index(worker)] = replacement
+        return replacement
+
+    @staticmethod
+    def _exit_outcome(proc):
+        """Maps the exit code of a dead worker to a (status, error) outcome."""
+        proc.join()
+        return _outcome_for_exit(proc.exitcode)
+
+    def map(self, jobs):
+        """Runs jobs and returns their (status, value) outcomes in job order."""
+        outcomes = [None] * len(jobs)
+        pending = deque(enumerate(jobs))
+        idle = list(self._workers)
+        busy = {}  # conn -> (worker, job index, deadline)
+        # A fork server enforces the timeout on its child itself; the pool deadline is a backstop
+        timeout = self.timeout + 1.0 if self.fork_per_sample else self.timeout
+
+        while pending or busy:
+            while idle and pending:
+                worker = idle.pop()
+                index, job = pending.popleft()
+                try:
+                    worker[1].send(job)
+                except (BrokenPipeError, OSError):
+                    pending.appendleft((index, job))
+                    idle.append(self._recycle(worker))
+                    continue
+                busy[worker[1]] = (worker, index, time.monotonic() + timeout)
+
+            wait_for = max(0.0, min(deadline for _, _, deadline in busy.values()) - time.monotonic())
+            for conn in multiprocessing.connection.wait(list(busy), timeout=wait_for):
+                worker, index, _ = busy.pop(conn)
+                try:
+                    outcomes[index] = conn.recv()
+                except (EOFError, OSError):
+                    outcomes[index] = self._exit_outcome(worker[0])
+                    idle.append(self._recycle(worker))
+                    continue
+                if outcomes[index][0] == "memory_exceeded" and not self.fork_per_sample:
+                    idle.append(self._recycle(worker))
+                else:
+                    idle.append(worker)
+
+            now = time.monotonic()
+            for conn, (worker, index, deadline) in list(busy.items()):
+                if now >= deadline:
+                    del busy[conn]
+                    outcomes[index] = ("timeout", f"Timed out after {self.timeout}s")
+                    idle.append(self._recycle(worker))
+        return outcomes
+
+    def close(self):
+        for proc, conn in self._workers:
+            try:
+                conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        for proc, conn in self._workers:
+            proc.join(timeout=1)
+            if proc.is_alive():
+                proc.kill()
+                proc.join()
+            conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def estimate_pass_at_k(num_samples, num_correct, k):
+    """
+    Unbiased per-task pass@k estimates, vectorized over tasks.
+    Uses the product form 1 - prod_{i=n-c+1}^{n} (1 - k/i) instead of binomials,
+    evaluated as a difference of cumulative log-sums so every task costs O(1).
+    """
+    n = np.asarray(num_samples, dtype=np.int64)
+    c = np.asarray(num_correct, dtype=np.int64)
+    if n.size == 0:
+        return np.zeros(0)
+    i = np.arange(1, n.max() + 1, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        log_terms = np.log1p(-k / i)
+    # Terms with i <= k only appear when n - c < k, which is masked below
+    log_terms[i <= k] = 0.0
+    cumulative = np.concatenate(([0.0], np.cumsum(log_terms)))
+    log_fail = cumulative[n] - cumulative[n - c]
+    return np.where(n - c < k, 1.0, 1.0 - np.exp(log_fail))
+
+def group_by_task(results):
+    """Returns (task_ids, n, c): samples and correct samples per task, in first-seen order."""
+    counts = {}
+    for r in results:
+        n_c = counts.setdefault(r["task_id"], [0, 0])
+        n_c[0] += 1
+        n_c[1] += bool(r["passed"])
+    task_ids = list(counts)
+    n = np.array([counts[t][0] for t in task_ids], dtype=np.int64)
+    c = np.array([counts[t][1] for t in task_ids], dtype=np.int64)
+    return task_ids, n, c
 
 def compute_passk(results, k=1):
-    n = len(results)
-    correct = sum(r["passed"] for r in results)
-    if correct == n:
-        return 1.0
-    return 1 - math.comb(n - correct, k) / math.comb(n, k)
-
-def evaluate_model(generated_file, tasks_file, report_file, k_values=[1, 5]):
-    tasks = {t["task_id"]: t for t in jsonlines.open(tasks_file)}
-    results = []
-    with jsonlines.open(generated_file) as reader:
-        for record in reader:
-            task = tasks[record["task_id"]]
-            passed, error = safe_exec(record["completion"], task["test"])
-            results.append({
-                "task_id": task["task_id"],
-                "passed": passed,
-                "error": error
-            })
-    metrics = {f"pass@{k}": compute_passk(results, k) for k in k_values}
+    """Mean of the per-task unbiased pass@k estimates, or None if there are no results."""
+    _, n, c = group_by_task(results)
+    if len(n) == 0:
+        return None
+    return float(np.mean(estimate_pass_at_k(n, c, k)))
+
+def _write_report(report_file, metrics, per_task, spool):
+    """
+    Writes the same JSON as json.dump({"metrics", "per_task", "results"}, indent=2),
+    copying the results one at a time from the binary spool file (one JSON record per line).
+    """
     with open(report_file, "w") as f:
-        json.dump({"metrics": metrics, "results": results}, f, indent=2)
+        head = json.dumps({"metrics": metrics, "per_task": per_task, "results": []}, indent=2)
+        f.write(head[:-len("[]\n}")] + "[")
+        count = 0
+        for line in spool:
+            f.write(",\n    " if count else "\n    ")
+            f.write(json.dumps(loads(line), indent=2).replace("\n", "\n    "))
+            count += 1
+        f.write("\n  ]\n}" if count else "]\n}")
+
+def evaluate_model(generated_file, tasks_file, report_file, k_values=[1, 5], workers=1, timeout=TIMEOUT_SECONDS):
+    # Tasks are looked up through a byte-offset index, completions are streamed in
+    # chunks and every result is spooled to a temporary file as soon as it is known,
+    # so memory does not grow with the size of the completion file.
+    with JsonlIndex(tasks_file) as tasks, tempfile.TemporaryFile("w+b") as spool:
+        # Compile every test block up front; forked workers inherit the compiled code
+        for task_id in tasks:
+            compile_test(tasks[task_id]["test"])
+        records = iter_jsonl(generated_file)
+        chunk_size = max(1, workers) * 64
+        with SandboxPool(workers=workers, timeout=timeout) as pool:
+            while chunk := list(islice(records, chunk_size)):
+                jobs = [(record["completion"], tasks[record["task_id"]]["test"]) for record in chunk]
+                for record, (status, error) in zip(chunk, pool.map(jobs)):
+                    spool.write(dumps_line({
+                        "task_id": record["task_id"],
+                        "passed": status == "passed",
+                        "status": status,
+                        "error": error
+                    }))
+
+        spool.seek(0)
+        task_ids, n, c = group_by_task(loads(line) for line in spool)
+        per_task = {t: {"n": int(n[i]), "correct": int(c[i])} for i, t in enumerate(task_ids)}
+        metrics = {}
+        for k in k_values:
+            # pass@k is only defined for tasks with at least k samples. Unlike the old
+            # pooled estimate (which reported e.g. "pass@5": 0.0 for single-sample runs),
+            # an undefined pass@k is left out of "metrics" rather than reported as a number.
+            if len(n) == 0 or n.min() < k:
+                print(f"Skipping pass@{k}: some tasks have fewer than {k} samples.")
+                continue
+            estimates = estimate_pass_at_k(n, c, k)
+            metrics[f"pass@{k}"] = float(estimates.mean())
+            for i, t in enumerate(task_ids):
+                per_task[t][f"pass@{k}"] = float(estimates[i])
+
+        spool.seek(0)
+        _write_report(report_file, metrics, per_task, spool)
     print(metrics)
 
 if __name__ == "__main__":
-    evaluate_model("results/llama3_cot.jsonl", "tasks.jsonl", "results/report_llama3_cot.json")
-    evaluate_model("results/llama3_selfdebug.jsonl", "tasks.jsonl", "results/report_llama3_selfdebug.json")
+    workers = os.cpu_count() or 1
+    evaluate_model("results/llama3_cot.jsonl", "tasks.jsonl", "results/report_llama3_cot.json", workers=workers)
+    evaluate_model("results/llama3_selfdebug.jsonl", "tasks.jsonl", "results/report_llama3_selfdebug.json", workers=workers)
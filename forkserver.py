@@ -0,0 +1,136 @@
+import importlib
+import os
+import pickle
+import select
+import signal
+import time
+
+# --- Configuration ---
+# Imported once by each warm worker, so forked children start with them already loaded
+PRELOAD_MODULES = (
+    "bisect", "collections", "functools", "heapq", "itertools", "math", "random",
+    "re", "string", "typing", "coverage", "pytest",
+)
+# ---------------------
+
+FORK_AVAILABLE = hasattr(os, "fork")
+# Exit status of a child that ran out of memory so badly it could not even send back its result
+MEMORY_EXIT_CODE = 121
+
+def preload(modules=PRELOAD_MODULES):
+    """Imports the given modules in this process; missing ones are skipped."""
+    for name in modules:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+
+def set_limits(cpu_seconds, memory_bytes):
+    """Applies CPU and address-space limits to the current process (POSIX only)."""
+    try:
+        import resource
+    except ImportError:
+        return
+    if memory_bytes:
+        try:
+            resource.setrlimit(resource.RLIMIT_AS, (memory_bytes, memory_bytes))
+        except (ValueError, OSError):
+            pass  # e.g. macOS does not enforce RLIMIT_AS
+    if cpu_seconds:
+        # RLIMIT_CPU counts the whole process lifetime, so move the soft limit
+        # forward from what this process has already used.
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        used = int(usage.ru_utime + usage.ru_stime)
+        _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+        soft = used + cpu_seconds
+        if hard != resource.RLIM_INFINITY:
+            soft = min(soft, hard)
+        resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+def _read_result(fd, deadline):
+    """Reads everything the child writes to fd. Returns None if the deadline passes first."""
+    chunks = []
+    while True:
+        remaining = None if deadline is None else deadline - time.monotonic()
+        if remaining is not None and remaining <= 0:
+            return None
+        ready, _, _ = select.select([fd], [], [], remaining)
+        if not ready:
+            return None
+        chunk = os.read(fd, 1 << 16)
+        if not chunk:
+            return b"".join(chunks)
+        chunks.append(chunk)
+
+def run_forked(func, args=(), timeout=None, setup=None):
+    """
+    Runs func(*args) in a copy-on-write child of the current process and returns
+    (status, value):
+      ("ok", result)         func returned normally
+      ("error", exception)   func raised; the exception is re-created in the parent
+      ("timeout", None)      the child was still running after `timeout` seconds and was killed
+      ("crashed", code)      the child died without a result (code is its exit status,
+                             negative for a signal, MEMORY_EXIT_CODE if it ran out of
+                             memory while reporting)
+    setup, if given, is called in the child before func (e.g. to apply resource limits).
+    The child never returns to the caller's code: it always leaves through os._exit.
+    """
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        try:
+            if setup is not None:
+                setup()
+            outcome = ("ok", func(*args))
+        except BaseException as e:
+            outcome = ("error", e)
+        try:
+            try:
+                payload = pickle.dumps(outcome)
+            except Exception as e:
+                payload = pickle.dumps(("error", RuntimeError(f"Unpicklable result: {e}")))
+            with os.fdopen(write_fd, "wb") as f:
+                f.write(payload)
+        except MemoryError:
+            os._exit(MEMORY_EXIT_CODE)
+        finally:
+            os._exit(0)
+
+    os.close(write_fd)
+    deadline = None if timeout is None else time.monotonic() + timeout
+    try:
+        payload = _read_result(read_fd, deadline)
+    finally:
+        os.close(read_fd)
+
+    if payload is None:
+        os.kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+        return "timeout", None
+    _, status = os.waitpid(pid, 0)
+    if not payload:
+        return "crashed", -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+    return pickle.loads(payload)
+
+def call_forked(func, *args, timeout=None, cpu_seconds=None):
+    """
+    run_forked() for executor workers: returns func's result or raises its exception,
+    so a pool worker can hand each unit of work to a fresh child and stay clean itself.
+    The child is killed after `timeout` seconds of wall-clock time or `cpu_seconds` of
+    CPU time (RLIMIT_CPU); either raises TimeoutError.
+    Falls back to a direct call, without limits, on platforms without fork.
+    """
+    if not FORK_AVAILABLE:
+        return func(*args)
+    setup = (lambda: set_limits(cpu_seconds, None)) if cpu_seconds else None
+    status, value = run_forked(func, args, timeout=timeout, setup=setup)
+    if status == "ok":
+        return value
+    if status == "error":
+        raise value
+    if status == "timeout":
+        raise TimeoutError(f"Forked child timed out after {timeout}s")
+    if value == -getattr(signal, "SIGXCPU", 24):
+        raise TimeoutError(f"Forked child exceeded {cpu_seconds}s of CPU time")
+    raise RuntimeError(f"Forked child crashed (exit status {value})")
@@ -1,7 +1,20 @@
-import jsonlines
+import asyncio
+import functools
+import http.client
+import json
+import os
+import queue
 import subprocess
-from transformers import AutoModelForCausalLM, AutoTokenizer, pipeline
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
+from completion_cache import cache_key
+from jsonl_io import CheckpointWriter, completed_samples, iter_jsonl
+
+OLLAMA_HOST = os.environ.get("OLLAMA_HOST", "http://localhost:11434")
+INFERENCE_SERVER_URL = os.environ.get("INFERENCE_SERVER_URL", "http://127.0.0.1:8765")
 
 def get_prompt(task, mode="rim"):
     base_prompt = task["prompt"]
@@ -24,23 +37,391 @@ def generate_ollama(model, prompt):
     result = subprocess.run(cmd, capture_output=True, text=True)
     return result.stdout.strip()
 
-def generate_hf(model_name, prompt):
-    pipe = pipeline("text-generation", model=model_name, device_map="auto")
-    return pipe(prompt, max_new_tokens=256, temperature=0.2)[0]["generated_text"]
+class OllamaClient:
+    """
+    Streams completions from a running ollama server over its HTTP API.
+    Connections are kept alive in a small pool and reused across prompts, and at
+    most max_concurrency requests are in flight at the same time.
+    """
+    supports_seed = True
+
+    def __init__(self, model, host=OLLAMA_HOST, max_concurrency=4, timeout=600, options=None):
+        if "://" not in host:
+            host = "http://" + host
+        parsed = urllib.parse.urlsplit(host)
+        self.model = model
+        self.host = parsed.hostname
+        self.port = parsed.port or 11434
+        self.timeout = timeout
+        self.options = options or {}
+        self._connections = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+
+    @property
+    def sampling_params(self):
+        return dict(self.options)
+
+    def _acquire(self):
+        try:
+            return self._connections.get_nowait()
+        except queue.Empty:
+            return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def _stream(self, conn, prompt, on_token, seed=None):
+        options = self.options if seed is None else {**self.options, "seed": seed}
+        body = json.dumps({"model": self.model, "prompt": prompt, "stream": True, "options": options})
+        conn.request("POST", "/api/generate", body=body, headers={"Content-Type": "application/json"})
+        response = conn.getresponse()
+        if response.status != 200:
+            detail = response.read().decode("utf-8", errors="replace")
+            raise RuntimeError(f"ollama returned HTTP {response.status}: {detail}")
+        chunks = []
+        for line in response:
+            if not line.strip():
+                continue
+            event = json.loads(line)
+            if "error" in event:
+                raise RuntimeError(f"ollama error: {event['error']}")
+            token = event.get("response", "")
+            chunks.append(token)
+            if on_token is not None and token:
+                on_token(token)
+            if event.get("done"):
+                break
+        # Drain the rest of the body so the connection can be reused
+        response.read()
+        return "".join(chunks)
+
+    def generate(self, prompt, on_token=None, seed=None):
+        with self._slots:
+            conn = self._acquire()
+            try:
+                text = self._stream(conn, prompt, on_token, seed)
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                # A pooled keep-alive connection went stale; retry once on a fresh one
+                conn.close()
+                conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+                text = self._stream(conn, prompt, on_token, seed)
+            except Exception:
+                conn.close()
+                raise
+            self._connections.put(conn)
+        return text.strip()
+
+    def close(self):
+        while not self._connections.empty():
+            self._connections.get_nowait().close()
+
+class InferenceServerClient:
+    """
+    Thin client for inference_server.py. The server keeps the model loaded and
+    batches requests from every client together, so this only sends prompts.
+    Connections are pooled and kept alive like in OllamaClient.
+    """
+    supports_seed = True
+
+    def __init__(self, url=INFERENCE_SERVER_URL, max_concurrency=4, timeout=600, **params):
+        if "://" not in url:
+            url = "http://" + url
+        parsed = urllib.parse.urlsplit(url)
+        self.host = parsed.hostname
+        self.port = parsed.port or 8765
+        self.timeout = timeout
+        self.params = params  # max_new_tokens, temperature, do_sample
+        self._connections = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+
+    @property
+    def sampling_params(self):
+        return dict(self.params)
+
+    def _request(self, conn, method, path, payload=None):
+        body = json.dumps(payload) if payload is not None else None
+        conn.request(method, path, body=body, headers={"Content-Type": "application/json"})
+        response = conn.getresponse()
+        data = json.loads(response.read())
+        if response.status != 200:
+            raise RuntimeError(f"inference server returned HTTP {response.status}: {data.get('error')}")
+        return data
+
+    def _call(self, method, path, payload=None):
+        with self._slots:
+            try:
+                conn = self._connections.get_nowait()
+            except queue.Empty:
+                conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                data = self._request(conn, method, path, payload)
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                # A pooled keep-alive connection went stale; retry once on a fresh one
+                conn.close()
+                conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+                data = self._request(conn, method, path, payload)
+            except Exception:
+                conn.close()
+                raise
+            self._connections.put(conn)
+        return data
+
+    def complete(self, prompt, num_samples=1, seed=None, **params):
+        """
+        Returns num_samples raw completions (the text after the prompt) for one prompt.
+        With a seed, sample i is drawn with seed + i, so the results are reproducible.
+        """
+        payload = {"prompt": prompt, "num_samples": num_samples, **self.params, **params}
+        if seed is not None:
+            payload["seed"] = seed
+        return self._call("POST", "/generate", payload)["completions"]
+
+    def generate(self, prompt, seed=None):
+        return self.complete(prompt, seed=seed)[0].strip()
+
+    def metrics(self):
+        return self._call("GET", "/metrics")
+
+    def close(self):
+        while not self._connections.empty():
+            self._connections.get_nowait().close()
+
+class OllamaCLIGenerator:
+    """Old one-subprocess-per-prompt ollama backend, kept for machines without the server API."""
+    supports_seed = False  # `ollama run` cannot be given a seed
+
+    def __init__(self, model):
+        self.model = model
+        self.sampling_params = {}
 
-def run_eval(input_file, output_file, model="llama3", mode="cot", backend="ollama"):
-    with jsonlines.open(input_file) as reader, jsonlines.open(output_file, mode='w') as writer:
-        for task in tqdm(reader, desc=f"{model}-{mode}"):
+    def generate(self, prompt):
+        return generate_ollama(self.model, prompt)
+
+class HFGenerator:
+    """
+    Holds a Hugging Face text-generation pipeline for its whole lifetime, so the
+    weights are loaded once and reused across prompts, modes and run_eval calls.
+    With early_stop, decoding stops once a complete function and its closing ```
+    fence have been written (see stopping.py).
+    """
+    supports_seed = True
+
+    def __init__(self, model_name, max_new_tokens=256, temperature=0.2, early_stop=False):
+        self.model_name = model_name
+        self.max_new_tokens = max_new_tokens
+        self.temperature = temperature
+        self.early_stop = early_stop
+        self.pipe = None
+        self.load_time = 0.0
+        self.generate_time = 0.0
+        self.generated_tokens = 0
+        self.tokens_saved = 0
+        # The pipeline is not thread-safe, so concurrent callers take turns
+        self._lock = threading.Lock()
+
+    @property
+    def sampling_params(self):
+        params = {"max_new_tokens": self.max_new_tokens, "temperature": self.temperature}
+        if self.early_stop:
+            params["early_stop"] = True
+        return params
+
+    def load(self):
+        """Loads the model and tokenizer if they are not loaded yet."""
+        with self._lock:
+            if self.pipe is not None:
+                return self
+            start = time.perf_counter()
+            from transformers import pipeline
+            self.pipe = pipeline("text-generation", model=self.model_name, device_map="auto")
+            self.load_time = time.perf_counter() - start
+        return self
+
+    def warmup(self, prompt="def add(a, b):"):
+        """Loads the model and runs one tiny generation so the first real prompt is not slowed down."""
+        self.load()
+        self.pipe(prompt, max_new_tokens=1)
+        return self
+
+    def generate(self, prompt, seed=None):
+        self.load()
+        with self._lock:
+            if seed is not None:
+                # Generations take turns under the lock, so the seed applies to this prompt only
+                from transformers import set_seed
+                set_seed(seed)
+            kwargs = {}
+            if self.early_stop:
+                from transformers import StoppingCriteriaList
+                from stopping import FunctionCompleteCriteria
+                stopping = FunctionCompleteCriteria(self.pipe.tokenizer, self.max_new_tokens)
+                kwargs["stopping_criteria"] = StoppingCriteriaList([stopping])
+            start = time.perf_counter()
+            text = self.pipe(prompt, max_new_tokens=self.max_new_tokens, temperature=self.temperature, **kwargs)[0]["generated_text"]
+            self.generate_time += time.perf_counter() - start
+            if self.early_stop:
+                self.tokens_saved += stopping.tokens_saved
+            new_text = text[len(prompt):] if text.startswith(prompt) else text
+            self.generated_tokens += len(self.pipe.tokenizer(new_text, add_special_tokens=False)["input_ids"])
+        return text
+
+    def stats(self):
+        """Load time and per-token generation time, reported separately."""
+        per_token = self.generate_time / self.generated_tokens if self.generated_tokens else 0.0
+        return {
+            "load_time_s": round(self.load_time, 3),
+            "generate_time_s": round(self.generate_time, 3),
+            "generated_tokens": self.generated_tokens,
+            "ms_per_token": round(per_token * 1000, 3),
+            "tokens_saved": self.tokens_saved,
+        }
+
+_HF_GENERATORS = {}
+
+def get_hf_generator(model_name, early_stop=False):
+    """
+    Returns the shared HFGenerator for (model_name, early_stop), creating it on first use.
+    Generators for the same model share one loaded pipeline, so asking for the other
+    early_stop setting never reloads the weights or changes a generator already in use.
+    """
+    key = (model_name, early_stop)
+    if key not in _HF_GENERATORS:
+        generator = HFGenerator(model_name, early_stop=early_stop)
+        sibling = _HF_GENERATORS.get((model_name, not early_stop))
+        if sibling is not None:
+            sibling.load()
+            generator.pipe, generator._lock = sibling.pipe, sibling._lock
+        _HF_GENERATORS[key] = generator
+    return _HF_GENERATORS[key]
+
+def generate_hf(model_name, prompt, early_stop=False):
+    return get_hf_generator(model_name, early_stop=early_stop).generate(prompt)
+
+def make_generator(backend, model, max_concurrency=4, early_stop=False):
+    """Builds the generator object for a backend name ('ollama', 'ollama-cli', 'server' or 'hf')."""
+    if early_stop and backend != "hf":
+        # Only the hf backend can stop decoding early; elsewhere the flag would be dropped silently
+        raise ValueError(f"early_stop is only supported by the hf backend, not {backend!r}")
+    if backend == "ollama":
+        return OllamaClient(model, max_concurrency=max_concurrency)
+    if backend == "server":
+        # The server decides the model; `model` only labels the run and its cache keys
+        return InferenceServerClient(max_concurrency=max_concurrency)
+    if backend == "ollama-cli":
+        return OllamaCLIGenerator(model)
+    return get_hf_generator(model, early_stop=early_stop)
+
+async def _generation_pipeline(tasks, writer, generator, mode, num_samples, concurrency, ordered, queue_size, progress,
+                               model=None, cache=None, seed=None, completed=None):
+    """
+    Reader -> N generation workers -> writer, connected by asyncio queues.
+    The bounded job queue gives backpressure; the writer either writes records as
+    they finish or holds them in a reorder buffer so the output follows input order.
+    With a CompletionCache, only prompts that are not in the cache reach the backend.
+    `completed` maps task_id -> sample indices already written by an earlier run; those are skipped.
+    """
+    jobs = asyncio.Queue(maxsize=queue_size)
+    finished = asyncio.Queue()
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+
+    async def read():
+        index = 0
+        for task in tasks:
             prompt = get_prompt(task, mode)
-            if backend == "ollama":
-                completion = generate_ollama(model, prompt)
-            else:
-                completion = generate_hf(model, prompt)
-            writer.write({
+            # Several samples per task feed the unbiased pass@k estimate in evaluate.py
+            done = (completed or {}).get(task["task_id"], ())
+            for sample in range(num_samples):
+                if sample in done:
+                    continue
+                await jobs.put((index, sample, task, prompt))
+                index += 1
+        for _ in range(concurrency):
+            await jobs.put(None)
+
+    async def generate():
+        while (job := await jobs.get()) is not None:
+            index, sample, task, prompt = job
+            key = completion = None
+            if cache is not None:
+                key = cache_key(model, type(generator).__name__, prompt,
+                                getattr(generator, "sampling_params", {}), seed, sample)
+                completion = await loop.run_in_executor(executor, cache.get, key)
+            if completion is None:
+                if seed is None:
+                    completion = await loop.run_in_executor(executor, generator.generate, prompt)
+                else:
+                    # Each sample gets its own seed, so the samples differ but every one is reproducible
+                    completion = await loop.run_in_executor(
+                        executor, functools.partial(generator.generate, prompt, seed=seed + sample))
+                if cache is not None:
+                    await loop.run_in_executor(executor, cache.put, key, completion)
+            await finished.put((index, {
                 "task_id": task["task_id"],
+                "sample": sample,  # lets a resumed run find the samples that are still missing
                 "prompt": prompt,
                 "completion": completion
-            })
+            }))
+        await finished.put(None)
+
+    async def write():
+        workers_left = concurrency
+        reorder_buffer = {}
+        next_index = 0
+        while workers_left:
+            item = await finished.get()
+            if item is None:
+                workers_left -= 1
+                continue
+            index, record = item
+            progress.update(1)
+            if not ordered:
+                writer.write(record)
+                continue
+            reorder_buffer[index] = record
+            while next_index in reorder_buffer:
+                writer.write(reorder_buffer.pop(next_index))
+                next_index += 1
+
+    try:
+        await asyncio.gather(read(), write(), *(generate() for _ in range(concurrency)))
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def run_eval(input_file, output_file, model="llama3", mode="cot", backend="ollama", num_samples=1,
+             generator=None, concurrency=1, ordered=True, queue_size=None, cache=None, seed=None, resume=False,
+             early_stop=False):
+    """
+    Generates completions for every task in input_file with up to `concurrency`
+    prompts in flight. With ordered=True the output JSONL follows the input order;
+    with ordered=False records are written as soon as they finish.
+    Pass a CompletionCache as `cache` to reuse completions from earlier runs.
+    With resume=True, samples already in output_file (matched by each record's "sample"
+    index, so this also works with ordered=False) are skipped and new records are
+    appended with fsync'd checkpoints, so an interrupted run picks up where it stopped.
+    early_stop=True makes the hf backend stop each completion after its first complete function.
+    With a seed, sample i of every task is generated with seed + i (forwarded to the backend
+    as ollama's options["seed"], the server's "seed" or transformers.set_seed).
+    """
+    concurrency = max(1, concurrency)
+    if generator is None:
+        generator = make_generator(backend, model, max_concurrency=concurrency, early_stop=early_stop)
+    if seed is not None and not getattr(generator, "supports_seed", False):
+        # A seed that is never applied must not end up in the cache key either
+        print(f"Warning: {type(generator).__name__} cannot be seeded; ignoring seed={seed}.")
+        seed = None
+    completed = completed_samples(output_file) if resume else None
+    if completed:
+        print(f"Resuming: {sum(map(len, completed.values()))} completion(s) already in {output_file}")
+    with CheckpointWriter(output_file, append=resume) as writer, tqdm(desc=f"{model}-{mode}") as progress:
+        asyncio.run(_generation_pipeline(
+            iter_jsonl(input_file), writer, generator, mode, num_samples, concurrency,
+            ordered, queue_size or 2 * concurrency, progress,
+            model=model, cache=cache, seed=seed, completed=completed
+        ))
+    if isinstance(generator, HFGenerator):
+        print(f"{model}-{mode} timing: {generator.stats()}")
+    if isinstance(generator, InferenceServerClient):
+        print(f"{model}-{mode} server metrics: {generator.metrics()}")
+    if cache is not None:
+        print(f"{model}-{mode} cache: {cache.stats()}")
 
 if __name__ == "__main__":
     run_eval("tasks.jsonl", "results/llama3_rim.jsonl", model="llama3", mode="rim", backend="ollama")
@@ -1,7 +1,13 @@
 import argparse
-import json
+import time
+from concurrent.futures import ThreadPoolExecutor
 import torch
-from transformers import AutoTokenizer, AutoModelForCausalLM
+from transformers import AutoTokenizer, AutoModelForCausalLM, StoppingCriteriaList
+from completion_cache import CompletionCache, cache_key
+from generate_llm import InferenceServerClient
+from jsonl_io import CheckpointWriter, count_completed, iter_jsonl
+from prefix_cache import shared_prefill
+from stopping import FunctionCompleteCriteria, target_function
 
 # Define the prompt templates
 PROMPT_TEMPLATES = {
@@ -16,6 +22,72 @@ PROMPT_TEMPLATES = {
 """
 }
 
+GENERATION_KWARGS = {
+    "max_new_tokens": 512, # Adjust as needed
+    "temperature": 0.7,
+    "do_sample": True,
+}
+
+def count_new_tokens(outputs, prompt_length, pad_token_id):
+    """Counts generated (non-padding) tokens after the prompt columns."""
+    return int((outputs[:, prompt_length:] != pad_token_id).sum())
+
+def generate_batch(model, tokenizer, prompts, device, num_samples=1, share_prefill=False, targets=None):
+    """
+    Generates num_samples completions for each prompt in one left-padded batch.
+    With share_prefill, each prompt is prefilled once and its KV cache is copied to
+    its samples, instead of every sample recomputing the prompt.
+    With targets (one function name per prompt), each sample stops as soon as it has
+    written a complete definition of its target followed by the closing ``` fence.
+    Returns (completions per prompt, number of generated tokens, tokens saved by stopping early).
+    """
+    inputs = tokenizer(prompts, return_tensors="pt", padding=True).to(device)
+    stopping = None
+    if targets is not None:
+        stopping = FunctionCompleteCriteria(
+            tokenizer, GENERATION_KWARGS["max_new_tokens"],
+            [target for target in targets for _ in range(num_samples)]
+        )
+    if share_prefill and num_samples > 1:
+        input_ids, attention_mask, cache = shared_prefill(
+            model, inputs["input_ids"], inputs["attention_mask"], num_samples
+        )
+        outputs = model.generate(
+            input_ids=input_ids,
+            attention_mask=attention_mask,
+            past_key_values=cache,
+            **GENERATION_KWARGS,
+            stopping_criteria=StoppingCriteriaList([stopping]) if stopping else None,
+            pad_token_id=tokenizer.pad_token_id
+        )
+    else:
+        outputs = model.generate(
+            **inputs,
+            **GENERATION_KWARGS,
+            num_return_sequences=num_samples,
+            stopping_criteria=StoppingCriteriaList([stopping]) if stopping else None,
+            pad_token_id=tokenizer.pad_token_id
+        )
+
+    completions = []
+    for i, prompt in enumerate(prompts):
+        rows = outputs[i * num_samples:(i + 1) * num_samples]
+        # Decode each row and strip the prompt, exactly like the serial path
+        texts = tokenizer.batch_decode(rows, skip_special_tokens=True)
+        completions.append([text[len(prompt):].strip() for text in texts])
+    n_tokens = count_new_tokens(outputs, inputs["input_ids"].shape[1], tokenizer.pad_token_id)
+    return completions, n_tokens, stopping.tokens_saved if stopping else 0
+
+def generate_remote(client, prompts, num_samples=1, seed=None):
+    """
+    generate_batch() against a running inference_server.py: the prompts are sent
+    concurrently and the server batches them with every other client's requests.
+    With a seed, sample i of every prompt is drawn with seed + i on the server.
+    """
+    with ThreadPoolExecutor(max_workers=len(prompts)) as pool:
+        results = pool.map(lambda prompt: client.complete(prompt, num_samples, seed=seed), prompts)
+        return [[text.strip() for text in texts] for texts in results]
+
 def main():
     # --- 1. Set up command-line argument parsing ---
     parser = argparse.ArgumentParser(description="Generate model completions for HumanEval tasks.")
@@ -23,61 +95,136 @@ def main():
     parser.add_argument("--tasks_file", type=str, required=True, help="Path to the input tasks.jsonl file.")
     parser.add_argument("--output_file", type=str, required=True, help="Path to save the output jsonl file.")
     parser.add_argument("--prompt_style", type=str, choices=['cot', 'self-debug'], required=True, help="The prompt style to use ('cot' or 'self-debug').")
+    parser.add_argument("--num_samples", type=int, default=1, help="Number of completions to sample per task (used for pass@k).")
+    parser.add_argument("--batch_size", type=int, default=1, help="Number of prompts per padded generation batch (1 = one prompt at a time).")
+    parser.add_argument("--share_prefill", action="store_true", help="Prefill each prompt once and share it across its --num_samples samples.")
+    parser.add_argument("--early_stop", action="store_true", help="Stop each sample once it has written a complete target function and its closing ``` fence (not recommended with self-debug, whose final answer comes last).")
+    parser.add_argument("--resume", action="store_true", help="Skip samples already in --output_file and append the rest.")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for sampling (also part of the cache key).")
+    parser.add_argument("--cache_path", type=str, default=None, help="SQLite file for the completion cache (disabled if not set).")
+    parser.add_argument("--cache_max_mb", type=int, default=512, help="Size bound of the completion cache in MB (LRU eviction).")
+    parser.add_argument("--server_url", type=str, default=None, help="Send prompts to a running inference_server.py instead of loading the model here (--model_name is then only a label; --seed is sent to the server).")
     args = parser.parse_args()
+    if args.early_stop and args.server_url:
+        parser.error("--early_stop is not supported with --server_url: the inference server does not stop at the target function")
 
     # --- 2. Load Model and Tokenizer ---
-    print(f"Loading model: {args.model_name}...")
-    # Check if GPU is available and set the device
-    device = "cuda" if torch.cuda.is_available() else "cpu"
-    print(f"Using device: {device}")
-    
-    # New code with 4-bit quantization
-
-    # Old code
-    tokenizer = AutoTokenizer.from_pretrained(args.model_name)
-    model = AutoModelForCausalLM.from_pretrained(args.model_name).to(device)
-    
-    if tokenizer.pad_token is None:
-        tokenizer.pad_token = tokenizer.eos_token
+    client = model = tokenizer = device = None
+    if args.server_url:
+        print(f"Using inference server at {args.server_url} (model label: {args.model_name})")
+        client = InferenceServerClient(args.server_url, max_concurrency=args.batch_size, **GENERATION_KWARGS)
+    else:
+        print(f"Loading model: {args.model_name}...")
+        # Check if GPU is available and set the device
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+        print(f"Using device: {device}")
+        
+        # New code with 4-bit quantization
+
+        # Old code
+        tokenizer = AutoTokenizer.from_pretrained(args.model_name)
+        model = AutoModelForCausalLM.from_pretrained(args.model_name).to(device)
+        
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+        # Decoder-only models must be padded on the left so every row ends at the prompt boundary
+        tokenizer.padding_side = "left"
+
+    if args.seed is not None:
+        torch.manual_seed(args.seed)
+    cache = None
+    if args.cache_path:
+        cache = CompletionCache(args.cache_path, max_bytes=args.cache_max_mb * 1024 * 1024)
 
     # --- 3. Process Tasks and Generate Completions ---
     print(f"Processing tasks from {args.tasks_file}...")
     prompt_template = PROMPT_TEMPLATES[args.prompt_style]
 
-    with open(args.tasks_file, 'r') as infile, open(args.output_file, 'w') as outfile:
-        for line in infile:
-            task = json.loads(line)
-            task_id = task["task_id"]
-            base_prompt = task["prompt"]
-            
-            # Format the full prompt using the chosen template
-            full_prompt = prompt_template.format(base_prompt=base_prompt)
-            
-            # Tokenize the input
-            inputs = tokenizer(full_prompt, return_tensors="pt").to(device)
-
-            # Generate the completion
-            outputs = model.generate(
-                **inputs,
-                max_new_tokens=512, # Adjust as needed
-                temperature=0.7,
-                do_sample=True
-            )
-            
-            # Decode the generated text, removing the prompt part
-            full_text = tokenizer.decode(outputs[0], skip_special_tokens=True)
-            completion = full_text[len(full_prompt):].strip()
-
-            # Prepare the result and write to the output file
-            result = {
-                "task_id": task_id,
-                "prompt": full_prompt,
-                "completion": completion
-            }
-            outfile.write(json.dumps(result) + "\n")
-            print(f"Generated completion for {task_id}")
+    tasks = list(iter_jsonl(args.tasks_file))
+    # Format the full prompts using the chosen template
+    prompts = [prompt_template.format(base_prompt=task["prompt"]) for task in tasks]
+
+    # On resume, only tasks that still need samples are generated
+    completed = count_completed(args.output_file) if args.resume else {}
+    if completed:
+        print(f"Resuming: {sum(completed.values())} completion(s) already in {args.output_file}")
+    remaining = [i for i, task in enumerate(tasks) if completed.get(task["task_id"], 0) < args.num_samples]
+
+    # Batch prompts of similar length together to keep padding small
+    # (the server does its own batching, so there the task order is kept)
+    order = remaining if client else sorted(remaining, key=lambda i: len(tokenizer(prompts[i])["input_ids"]))
+    batches = [order[i:i + args.batch_size] for i in range(0, len(order), args.batch_size)]
+
+    results = {}
+    write_order = iter(remaining)
+    next_to_write = next(write_order, None)
+    # Early-stopped completions are shorter, so they get their own cache entries
+    cache_params = dict(GENERATION_KWARGS, early_stop=True) if args.early_stop else GENERATION_KWARGS
+    total_tokens = 0
+    tokens_saved = 0
+    start = time.perf_counter()
+
+    with CheckpointWriter(args.output_file, append=args.resume) as outfile:
+        for batch in batches:
+            # Serve prompts whose samples are all cached; only the rest reach the model
+            keys = {
+                i: [cache_key(args.model_name, "hf-generate", prompts[i], cache_params, args.seed, sample)
+                    for sample in range(args.num_samples)]
+                for i in batch
+            } if cache is not None else {}
+            to_generate = []
+            for i in batch:
+                cached = [cache.get(key) for key in keys[i]] if cache is not None else [None]
+                if all(completion is not None for completion in cached):
+                    results[i] = cached
+                    print(f"Loaded {args.num_samples} cached completion(s) for {tasks[i]['task_id']}")
+                else:
+                    to_generate.append(i)
+
+            if to_generate:
+                if client:
+                    completions = generate_remote(client, [prompts[i] for i in to_generate], args.num_samples, args.seed)
+                else:
+                    completions, n_tokens, saved = generate_batch(
+                        model, tokenizer, [prompts[i] for i in to_generate], device, args.num_samples,
+                        share_prefill=args.share_prefill,
+                        targets=[target_function(tasks[i]) for i in to_generate] if args.early_stop else None
+                    )
+                    total_tokens += n_tokens
+                    tokens_saved += saved
+                for i, task_completions in zip(to_generate, completions):
+                    results[i] = task_completions
+                    if cache is not None:
+                        for key, completion in zip(keys[i], task_completions):
+                            cache.put(key, completion)
+                    print(f"Generated {args.num_samples} completion(s) for {tasks[i]['task_id']}")
+
+            # Write finished tasks in the original task order
+            while next_to_write is not None and next_to_write in results:
+                task_id = tasks[next_to_write]["task_id"]
+                # A resumed task may already have some of its samples on disk
+                for completion in results.pop(next_to_write)[completed.get(task_id, 0):]:
+                    result = {
+                        "task_id": task_id,
+                        "prompt": prompts[next_to_write],
+                        "completion": completion
+                    }
+                    outfile.write(result)
+                next_to_write = next(write_order, None)
 
+    elapsed = time.perf_counter() - start
+    if client:
+        print(f"\nFinished in {elapsed:.1f}s. Server metrics: {client.metrics()}")
+        client.close()
+    else:
+        print(f"\nGenerated {total_tokens} tokens in {elapsed:.1f}s "
+              f"({total_tokens / elapsed if elapsed else 0.0:.1f} tokens/sec, batch_size={args.batch_size})")
+        if args.early_stop:
+            print(f"Early stopping saved {tokens_saved} tokens (max_new_tokens={GENERATION_KWARGS['max_new_tokens']} per sample)")
+    if cache is not None:
+        print(f"Completion cache: {cache.stats()}")
+        cache.close()
     print(f"\n✅ All tasks processed. Output saved to {args.output_file}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,53 @@
+import hashlib
+import importlib.util
+import marshal
+import os
+import tempfile
+
+# --- Configuration ---
+HARNESS_CACHE_DIR = ".cache/harness"
+# ---------------------
+
+_compiled = {}  # cache key -> code object, per process
+
+def _cache_key(test_source: str, filename: str) -> str:
+    # Bytecode is only valid for the interpreter version that produced it
+    digest = hashlib.sha256(importlib.util.MAGIC_NUMBER)
+    digest.update(filename.encode("utf-8") + b"\0" + test_source.encode("utf-8"))
+    return digest.hexdigest()
+
+def compile_test(test_source: str, filename: str = "<benchmark test>", cache_dir: str = HARNESS_CACHE_DIR):
+    """
+    Returns the compiled code object for a task's test block.
+    Each distinct block is compiled once per process and kept in memory; the bytecode
+    is also marshalled to cache_dir so other workers and later runs can load it
+    instead of compiling again. Pass cache_dir=None to keep it in memory only.
+    """
+    key = _cache_key(test_source, filename)
+    code = _compiled.get(key)
+    if code is not None:
+        return code
+
+    path = os.path.join(cache_dir, key + ".bin") if cache_dir else None
+    if path and os.path.exists(path):
+        try:
+            with open(path, 'rb') as f:
+                code = marshal.load(f)
+        except (OSError, EOFError, ValueError, TypeError):
+            code = None
+
+    if code is None:
+        code = compile(test_source, filename, "exec")
+        if path:
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+                # Write to a temporary file and rename, so readers never see a partial file
+                fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+                with os.fdopen(fd, 'wb') as f:
+                    marshal.dump(code, f)
+                os.replace(tmp_path, path)
+            except OSError:
+                pass
+
+    _compiled[key] = code
+    return code
@@ -0,0 +1,103 @@
+import builtins
+import hashlib
+import importlib
+import symtable
+from collections import OrderedDict
+
+# Only these names are ever imported on a solution's behalf. The list is kept short on
+# purpose: pure, side-effect-free modules that solutions routinely forget to import,
+# never anything that does work at import time (e.g. `this`, `antigravity`) or
+# touches the filesystem, network or processes.
+ALLOWED_MODULES = frozenset({
+    "bisect", "collections", "functools", "heapq", "itertools", "math", "re", "string", "typing",
+})
+
+# Members of the allowed modules that solutions often use bare, e.g. `List` or `sqrt`.
+# Maps the bare name to the module it comes from.
+KNOWN_MEMBERS = {
+    **{name: "typing" for name in (
+        "Any", "Callable", "Dict", "FrozenSet", "Iterable", "Iterator", "List", "Optional",
+        "Sequence", "Set", "Tuple", "Union",
+    )},
+    **{name: "collections" for name in ("Counter", "OrderedDict", "defaultdict", "deque", "namedtuple")},
+    **{name: "functools" for name in ("cache", "lru_cache", "partial", "reduce")},
+    **{name: "itertools" for name in (
+        "accumulate", "chain", "combinations", "groupby", "permutations", "product", "zip_longest",
+    )},
+    **{name: "math" for name in ("ceil", "factorial", "floor", "gcd", "inf", "isqrt", "log", "pi", "sqrt")},
+    **{name: "heapq" for name in ("heapify", "heappop", "heappush")},
+    **{name: "bisect" for name in ("bisect_left", "bisect_right", "insort")},
+}
+
+_BUILTINS = set(dir(builtins))
+_CACHE_SIZE = 4096
+_cache = OrderedDict()  # sha256 of the code -> tuple of (module, member or None)
+
+def _global_names(table: symtable.SymbolTable, bound: set, free: set):
+    """
+    Collects the names bound at module level and the names some scope looks up as a global.
+    A parameter or local of a function is resolved in that function's own scope, so it is
+    never counted as free, even when the same name is missing elsewhere.
+    """
+    for symbol in table.get_symbols():
+        name = symbol.get_name()
+        if table.get_type() == "module" and symbol.is_local():
+            bound.add(name)
+        elif symbol.is_declared_global():
+            bound.add(name)  # `global x` inside a function may bind it at module level
+        elif symbol.is_referenced() and symbol.is_global():
+            free.add(name)
+    for child in table.get_children():
+        _global_names(child, bound, free)
+
+def _resolve(code: str) -> tuple:
+    try:
+        table = symtable.symtable(code, "<solution>", "exec")
+    except SyntaxError:
+        return ()
+    bound, free = set(), set()
+    _global_names(table, bound, free)
+    missing = []
+    for name in sorted(free - bound - _BUILTINS):
+        if name in ALLOWED_MODULES:
+            missing.append((name, None))
+        elif name in KNOWN_MEMBERS:
+            missing.append((KNOWN_MEMBERS[name], name))
+    return tuple(missing)
+
+def missing_imports(code: str) -> tuple:
+    """
+    Finds the allowlisted names (ALLOWED_MODULES and KNOWN_MEMBERS) the code looks up
+    as globals but never binds at module level.
+    Returns (module, member) pairs; member is None for a plain `import module`.
+    Results are cached by a hash of the code, so each distinct solution is parsed once.
+    """
+    digest = hashlib.sha256(code.encode("utf-8")).digest()
+    if digest in _cache:
+        _cache.move_to_end(digest)
+        return _cache[digest]
+    result = _resolve(code)
+    _cache[digest] = result
+    if len(_cache) > _CACHE_SIZE:
+        _cache.popitem(last=False)
+    return result
+
+def import_statements(code: str) -> list:
+    """The missing imports as source lines, e.g. ['import re', 'from typing import List']."""
+    return [f"from {module} import {member}" if member else f"import {module}"
+            for module, member in missing_imports(code)]
+
+def inject_imports(namespace: dict, code: str):
+    """
+    Imports whatever the code is missing straight into namespace, so the code can
+    run unchanged (no extra lines, so coverage line numbers are not shifted).
+    """
+    for module_name, member in missing_imports(code):
+        name = member or module_name
+        if name in namespace:
+            continue
+        try:
+            module = importlib.import_module(module_name)
+            namespace[name] = getattr(module, member) if member else module
+        except (ImportError, AttributeError):
+            pass
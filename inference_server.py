@@ -0,0 +1,435 @@
+"""
+Long-lived local inference server with continuous batching.
+
+The model is loaded once and serves every client (generate_solutions.py with
+--server_url, run_eval with backend="server"). A scheduler thread keeps one batch
+of in-flight sequences; after every decoded token, finished sequences leave it and
+queued requests join it, so a new request never waits for a whole batch to drain.
+
+Endpoints:
+    POST /generate  {"prompt", "num_samples", "max_new_tokens", "temperature", "do_sample", "seed"}
+                    -> {"completions": [...]}  (text after the prompt, one per sample;
+                    with a seed, sample i is drawn with seed + i)
+    GET  /metrics   throughput, queue depth, time-to-first-token and batch statistics
+    GET  /health
+
+Usage:
+    python inference_server.py --model_name codellama/CodeLlama-7b-hf [--port 8765]
+"""
+import argparse
+import json
+import queue
+import statistics
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import torch
+from transformers import AutoModelForCausalLM, AutoTokenizer
+from transformers.cache_utils import Cache, DynamicLayer
+from prefix_cache import PREFIX_CACHE_BYTES, PrefixCache
+
+# --- Configuration ---
+DEFAULT_PORT = 8765
+MAX_BATCH_SIZE = 8          # sequences decoded together per step
+MAX_NEW_TOKENS = 512
+TEMPERATURE = 0.7
+METRICS_WINDOW = 1000       # recent requests kept for the TTFT percentiles
+# ---------------------
+
+class Sequence:
+    """One sample being generated: its token ids, its own KV cache and its timings."""
+
+    def __init__(self, prompt, prompt_ids, max_new_tokens, temperature, do_sample, generator=None):
+        self.prompt = prompt
+        self.prompt_ids = prompt_ids
+        self.max_new_tokens = max_new_tokens
+        self.temperature = temperature
+        self.do_sample = do_sample
+        self.generator = generator  # torch.Generator for a seeded sequence
+        self.generated = []
+        self.kv = None              # prefilled per layer (keys, values), [1, heads, length, head_dim], until it joins
+        self.submitted_at = time.perf_counter()
+        self.first_token_at = None
+        self.completion = None
+        self.error = None
+        self.done = threading.Event()
+
+class _SlotLayer(DynamicLayer):
+    """One layer of a SlotKV, seen by the model as a cache layer that is updated in place."""
+
+    def __init__(self, slots, layer):
+        super().__init__()
+        self.slots = slots
+        self.layer = layer
+        self.is_initialized = True
+
+    def update(self, key_states, value_states, *args, **kwargs):
+        slots = self.slots
+        keys, values = slots.keys[self.layer], slots.values[self.layer]
+        keys[:slots.rows, :, slots.end:slots.end + 1] = key_states
+        values[:slots.rows, :, slots.end:slots.end + 1] = value_states
+        window = slice(slots.start, slots.end + 1)
+        return keys[:slots.rows, :, window], values[:slots.rows, :, window]
+
+    def get_seq_length(self):
+        return self.slots.end - self.slots.start
+
+    def get_mask_sizes(self, query_length):
+        return self.get_seq_length() + query_length, 0
+
+class SlotKV:
+    """
+    Preallocated KV cache for the running batch, one row (slot) per active sequence.
+    Every row's tokens end at column `end` and are left-padded with masked columns, so
+    a decode step writes the new token's keys and values into column `end` in place
+    and attends over a view of columns [start, end]. Memory is only copied when a
+    sequence joins (its prompt KV is copied into its row, and the buffer is padded or
+    grown if that row does not fit), when one leaves (the last row moves into its
+    slot) and when the columns run out (the capacity doubles, so this is amortized).
+    """
+
+    def __init__(self, num_slots):
+        self.num_slots = num_slots
+        self.keys = self.values = None  # per layer [num_slots, heads, capacity, head_dim]
+        self.mask = None                # [num_slots, capacity], 1 where a row holds a token
+        self.lengths = []               # tokens held by each row, i.e. its next position id
+        self.start = self.end = 0
+        self.cache = None
+
+    @property
+    def rows(self):
+        return len(self.lengths)
+
+    @property
+    def capacity(self):
+        return self.mask.shape[1] if self.mask is not None else 0
+
+    def _relocate(self, new_end, capacity, like):
+        """
+        Moves the occupied columns so they end at new_end, in freshly zeroed buffers of
+        `capacity` columns; `like` gives per layer (keys, values) to take shapes from.
+        """
+        width = self.end - self.start
+        old_keys, old_values, old_mask = self.keys, self.values, self.mask
+        self.keys = [k.new_zeros(self.num_slots, k.shape[1], capacity, k.shape[3]) for k, _ in like]
+        self.values = [v.new_zeros(self.num_slots, v.shape[1], capacity, v.shape[3]) for _, v in like]
+        self.mask = torch.zeros(self.num_slots, capacity, dtype=torch.long, device=like[0][0].device)
+        if self.rows and width:
+            old, new = slice(self.start, self.end), slice(new_end - width, new_end)
+            for layer in range(len(like)):
+                self.keys[layer][:self.rows, :, new] = old_keys[layer][:self.rows, :, old]
+                self.values[layer][:self.rows, :, new] = old_values[layer][:self.rows, :, old]
+            self.mask[:self.rows, new] = old_mask[:self.rows, old]
+        self.start, self.end = new_end - width, new_end
+        self.cache = Cache(layers=[_SlotLayer(self, layer) for layer in range(len(like))])
+
+    def add(self, kv):
+        """Copies a prefilled sequence's KV into a new row at the bottom of the batch."""
+        n = kv[0][0].shape[-2]
+        if not self.rows:
+            # Empty batch: the new row can start anywhere, so reuse the buffer if it fits
+            self.start = self.end = min(n, self.capacity)
+        if self.end < n or self.end == self.capacity:
+            width = max(n, self.end - self.start)
+            self._relocate(width, max(self.capacity, 2 * width), kv)
+        row, first = self.rows, self.end - n
+        for layer, (keys, values) in enumerate(kv):
+            self.keys[layer][row, :, first:self.end] = keys[0]
+            self.values[layer][row, :, first:self.end] = values[0]
+        if first < self.start:
+            self.mask[:row, first:self.start] = 0  # newly exposed columns are padding for the other rows
+            self.start = first
+        self.mask[row] = 0
+        self.mask[row, first:self.end] = 1
+        self.lengths.append(n)
+
+    def remove(self, row):
+        """Frees a row by moving the last row into it."""
+        last = self.rows - 1
+        if row != last:
+            window = slice(self.start, self.end)
+            for keys, values in zip(self.keys, self.values):
+                keys[row, :, window] = keys[last, :, window]
+                values[row, :, window] = values[last, :, window]
+            self.mask[row, window] = self.mask[last, window]
+            self.lengths[row] = self.lengths[last]
+        self.lengths.pop()
+        # Columns no remaining row uses drop out of the attended window
+        self.start = self.end - max(self.lengths, default=0)
+
+    def prepare_step(self):
+        """Makes room for one more column and returns the attention mask for the next decode step."""
+        if self.end == self.capacity:
+            width = self.end - self.start
+            capacity = self.capacity if width < self.capacity // 2 else 2 * self.capacity
+            self._relocate(width, capacity, list(zip(self.keys, self.values)))
+        self.mask[:self.rows, self.end] = 1
+        return self.mask[:self.rows, self.start:self.end + 1].contiguous()
+
+    def advance(self):
+        """Accounts for the column the decode step just wrote."""
+        self.end += 1
+        self.lengths = [n + 1 for n in self.lengths]
+
+    def clear(self):
+        self.lengths = []
+        self.start = self.end = 0
+
+class ContinuousBatcher:
+    """
+    Schedules sequences over one model at token granularity.
+    A new sequence is prefilled on its own and then joins the running batch by
+    copying its KV into a free row of a preallocated SlotKV; decode steps then
+    write each new token's KV in place instead of rebuilding the batch cache.
+    Prefill goes through a PrefixCache, so a prompt that shares a prefix with a
+    recent one (same template, or another sample of the same task) only runs the
+    model over its new tokens.
+    """
+
+    def __init__(self, model, tokenizer, max_batch_size=MAX_BATCH_SIZE, prefix_cache_bytes=PREFIX_CACHE_BYTES):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_batch_size = max_batch_size
+        self.device = next(model.parameters()).device
+        self.prefix_cache = PrefixCache(model, prefix_cache_bytes) if prefix_cache_bytes else None
+        self._queue = queue.Queue()
+        self._active = []           # row i of self._slots belongs to self._active[i]
+        self._slots = SlotKV(max_batch_size)
+        self._lock = threading.Lock()
+        self._started_at = None
+        self._requests_completed = 0
+        self._tokens_generated = 0
+        self._decode_steps = 0
+        self._batched_rows = 0
+        self._ttft = deque(maxlen=METRICS_WINDOW)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, prompt, max_new_tokens=MAX_NEW_TOKENS, temperature=TEMPERATURE, do_sample=True, seed=None):
+        """Queues one sequence and returns it; wait on seq.done for the result."""
+        prompt_ids = self.tokenizer(prompt)["input_ids"]
+        generator = torch.Generator(device=self.device).manual_seed(seed) if seed is not None else None
+        seq = Sequence(prompt, prompt_ids, max_new_tokens, temperature, do_sample, generator)
+        with self._lock:
+            if self._started_at is None:
+                self._started_at = time.perf_counter()
+        self._queue.put(seq)
+        return seq
+
+    def generate(self, prompt, num_samples=1, seed=None, **params):
+        """
+        Generates num_samples completions for one prompt (each is the text after the prompt).
+        With a seed, sample i is drawn from its own generator seeded with seed + i.
+        """
+        sequences = [self.submit(prompt, seed=None if seed is None else seed + i, **params) for i in range(num_samples)]
+        for seq in sequences:
+            seq.done.wait()
+            if seq.error is not None:
+                raise seq.error
+        return [seq.completion for seq in sequences]
+
+    def metrics(self):
+        with self._lock:
+            elapsed = time.perf_counter() - self._started_at if self._started_at else 0.0
+            ttft = sorted(self._ttft)
+            return {
+                "requests_completed": self._requests_completed,
+                "tokens_generated": self._tokens_generated,
+                "throughput_tokens_per_s": round(self._tokens_generated / elapsed, 2) if elapsed else 0.0,
+                "queue_depth": self._queue.qsize(),
+                "active_sequences": len(self._active),
+                "mean_batch_size": round(self._batched_rows / self._decode_steps, 2) if self._decode_steps else 0.0,
+                "ttft_ms_mean": round(statistics.mean(ttft) * 1000, 2) if ttft else None,
+                "ttft_ms_p50": round(ttft[len(ttft) // 2] * 1000, 2) if ttft else None,
+                "ttft_ms_p95": round(ttft[int(len(ttft) * 0.95)] * 1000, 2) if ttft else None,
+                **(self.prefix_cache.stats() if self.prefix_cache else {}),
+            }
+
+    # --- Scheduler thread ---
+
+    def _run(self):
+        with torch.inference_mode():
+            while True:
+                self._admit()
+                if self._active:
+                    try:
+                        self._decode_step()
+                    except Exception as e:
+                        for seq in self._active:
+                            self._finish(seq, error=e)
+                        self._active = []
+                        self._slots.clear()
+
+    def _admit(self):
+        """Moves queued sequences into the batch; blocks only when there is nothing to decode."""
+        while len(self._active) < self.max_batch_size:
+            try:
+                seq = self._queue.get(block=not self._active)
+            except queue.Empty:
+                return
+            try:
+                self._prefill(seq)
+            except Exception as e:
+                self._finish(seq, error=e)
+                continue
+            if not self._is_finished(seq):
+                self._slots.add(seq.kv)
+                seq.kv = None
+                self._active.append(seq)
+
+    def _prefill(self, seq):
+        if self.prefix_cache is not None:
+            seq.kv, logits = self.prefix_cache.prefill(seq.prompt_ids)
+        else:
+            out = self.model(input_ids=torch.tensor([seq.prompt_ids], device=self.device), use_cache=True)
+            seq.kv = [(layer.keys, layer.values) for layer in out.past_key_values.layers]
+            logits = out.logits[0, -1]
+        self._append_token(seq, logits)
+
+    def _decode_step(self):
+        batch, slots = self._active, self._slots
+        attention_mask = slots.prepare_step()
+        input_ids = torch.tensor([[seq.generated[-1]] for seq in batch], device=self.device)
+        position_ids = torch.tensor([[n] for n in slots.lengths], device=self.device)
+
+        out = self.model(
+            input_ids=input_ids,
+            attention_mask=attention_mask,
+            position_ids=position_ids,
+            past_key_values=slots.cache,
+            use_cache=True,
+        )
+        slots.advance()
+        for row, seq in enumerate(batch):
+            self._append_token(seq, out.logits[row, -1])
+
+        with self._lock:
+            self._decode_steps += 1
+            self._batched_rows += len(batch)
+        # Bottom-up, so the row moved into a freed slot has already been checked
+        for row in reversed(range(len(batch))):
+            if self._is_finished(batch[row]):
+                slots.remove(row)
+                batch[row] = batch[-1]
+                batch.pop()
+
+    def _append_token(self, seq, logits):
+        if seq.do_sample and seq.temperature > 0:
+            probs = torch.softmax(logits.float() / seq.temperature, dim=-1)
+            token = int(torch.multinomial(probs, 1, generator=seq.generator))
+        else:
+            token = int(torch.argmax(logits))
+        seq.generated.append(token)
+        if seq.first_token_at is None:
+            seq.first_token_at = time.perf_counter()
+            with self._lock:
+                self._ttft.append(seq.first_token_at - seq.submitted_at)
+        with self._lock:
+            self._tokens_generated += 1
+
+    def _is_finished(self, seq):
+        finished = (
+            len(seq.generated) >= seq.max_new_tokens
+            or seq.generated[-1] == self.tokenizer.eos_token_id
+        )
+        if finished:
+            self._finish(seq)
+        return finished
+
+    def _finish(self, seq, error=None):
+        if error is None:
+            # Decode prompt and completion together and strip the prompt by length,
+            # exactly like generate_solutions.py does for model.generate output
+            text = self.tokenizer.decode(seq.prompt_ids + seq.generated, skip_special_tokens=True)
+            seq.completion = text[len(seq.prompt):]
+        seq.error = error
+        seq.kv = None
+        with self._lock:
+            self._requests_completed += 1
+        seq.done.set()
+
+def load_model(model_name, device=None):
+    """Loads the tokenizer and model once for the lifetime of the server."""
+    device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModelForCausalLM.from_pretrained(model_name).to(device)
+    model.eval()
+    return model, tokenizer
+
+def make_handler(batcher):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive for the pooled clients
+
+        def _send_json(self, status, payload):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/metrics":
+                self._send_json(200, batcher.metrics())
+            elif self.path == "/health":
+                self._send_json(200, {"status": "ok"})
+            else:
+                self._send_json(404, {"error": f"Unknown path {self.path}"})
+
+        def do_POST(self):
+            if self.path != "/generate":
+                self._send_json(404, {"error": f"Unknown path {self.path}"})
+                return
+            try:
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                completions = batcher.generate(
+                    request["prompt"],
+                    num_samples=int(request.get("num_samples", 1)),
+                    max_new_tokens=int(request.get("max_new_tokens", MAX_NEW_TOKENS)),
+                    temperature=float(request.get("temperature", TEMPERATURE)),
+                    do_sample=bool(request.get("do_sample", True)),
+                    seed=int(request["seed"]) if request.get("seed") is not None else None,
+                )
+            except (KeyError, ValueError, TypeError) as e:
+                self._send_json(400, {"error": f"Bad request: {e}"})
+                return
+            except Exception as e:
+                self._send_json(500, {"error": str(e)})
+                return
+            self._send_json(200, {"completions": completions})
+
+        def log_message(self, format, *args):
+            pass  # one line per request would drown the scheduler output
+
+    return Handler
+
+def serve(model_name, host="127.0.0.1", port=DEFAULT_PORT, max_batch_size=MAX_BATCH_SIZE,
+          prefix_cache_bytes=PREFIX_CACHE_BYTES):
+    print(f"Loading model: {model_name}...")
+    model, tokenizer = load_model(model_name)
+    batcher = ContinuousBatcher(model, tokenizer, max_batch_size=max_batch_size, prefix_cache_bytes=prefix_cache_bytes)
+    server = ThreadingHTTPServer((host, port), make_handler(batcher))
+    server.daemon_threads = True
+    print(f"Serving {model_name} on http://{host}:{server.server_address[1]} (max_batch_size={max_batch_size})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"Final metrics: {batcher.metrics()}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a Hugging Face causal LM with continuous batching.")
+    parser.add_argument("--model_name", type=str, required=True, help="Name or path of the Hugging Face model.")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Interface to listen on.")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port to listen on.")
+    parser.add_argument("--max_batch_size", type=int, default=MAX_BATCH_SIZE, help="Sequences decoded together per step.")
+    parser.add_argument("--prefix_cache_mb", type=int, default=PREFIX_CACHE_BYTES // 1024 ** 2, help="Memory for prompt KV state kept for prefix reuse, in MB (0 disables it).")
+    args = parser.parse_args()
+    serve(args.model_name, args.host, args.port, args.max_batch_size, args.prefix_cache_mb * 1024 ** 2)
+
+if __name__ == "__main__":
+    main()
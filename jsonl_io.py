@@ -0,0 +1,283 @@
+import json
+import os
+from collections import Counter, OrderedDict
+from collections.abc import Mapping
+
+try:
+    import orjson
+except ImportError:  # optional: the stdlib json module is used instead
+    orjson = None
+
+INDEX_SUFFIX = ".idx"
+INDEX_VERSION = 1
+
+# --- Serialization backend ---
+# orjson is used when it is installed, unless JSONL_BACKEND=json is set
+# (JSONL_BACKEND must name one of BACKENDS; anything else is an error).
+# Either way the files are plain JSON Lines and can be read by both backends.
+# Note that orjson reads integers beyond 64 bits as floats; the records in this
+# pipeline only hold strings, booleans and small numbers. Cache keys are hashed
+# from stdlib json output (see completion_cache), so they do not depend on the backend.
+BACKENDS = ("orjson", "json")
+
+def _checked_backend(name: str) -> str:
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown JSON backend {name!r}; valid backends are: {', '.join(BACKENDS)}")
+    if name == "orjson" and orjson is None:
+        raise ImportError("orjson is not installed")
+    return name
+
+BACKEND = (_checked_backend(os.environ["JSONL_BACKEND"]) if os.environ.get("JSONL_BACKEND")
+           else "orjson" if orjson is not None else "json")
+
+def use_backend(name: str):
+    """Switches the serialization backend (one of BACKENDS) for this process."""
+    global BACKEND
+    BACKEND = _checked_backend(name)
+
+def loads(data):
+    """Parses one JSON document from str or bytes. Raises ValueError on bad input."""
+    if BACKEND == "orjson":
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # orjson rejects a few things json accepts (e.g. NaN), so retry with json
+            pass
+    return json.loads(data)
+
+def dumps_line(record) -> bytes:
+    """Serializes one record as a UTF-8 encoded JSON line, including the newline."""
+    if BACKEND == "orjson":
+        try:
+            return orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE)
+        except TypeError:
+            # e.g. integers over 64 bits or non-str keys; let json handle those
+            pass
+    return (json.dumps(record) + "\n").encode('utf-8')
+# ------------------------------
+
+def iter_jsonl(filename: str):
+    """Yields the records of a .jsonl file one at a time (constant memory)."""
+    with open(filename, 'rb') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                yield loads(line)
+            except ValueError as e:
+                print(f"Skipping bad line in {filename}: {e}")
+
+def write_jsonl(filename: str, records) -> int:
+    """Writes records from any iterable to a .jsonl file as they arrive. Returns the count."""
+    count = 0
+    with open(filename, 'wb') as f:
+        for record in records:
+            f.write(dumps_line(record))
+            count += 1
+    return count
+
+def build_index(filename: str) -> dict:
+    """Scans a .jsonl file once and returns task_id -> byte offsets of its records."""
+    offsets = {}
+    with open(filename, 'rb') as f:
+        offset = 0
+        for line in f:
+            if line.strip():
+                try:
+                    offsets.setdefault(loads(line)["task_id"], []).append(offset)
+                except (ValueError, KeyError) as e:
+                    print(f"Skipping bad line in {filename}: {e}")
+            offset += len(line)
+    return offsets
+
+def load_index(filename: str) -> dict:
+    """
+    Returns the task_id -> offsets index for a .jsonl file. The index is stored next to
+    the file (<file>.idx) and rebuilt only when the file's size or mtime changes.
+    """
+    stat = os.stat(filename)
+    index_file = filename + INDEX_SUFFIX
+    try:
+        with open(index_file, 'r', encoding='utf-8') as f:
+            stored = json.load(f)
+        if (stored.get("version"), stored.get("size"), stored.get("mtime_ns")) == (INDEX_VERSION, stat.st_size, stat.st_mtime_ns):
+            return stored["offsets"]
+    except (OSError, ValueError, AttributeError):
+        pass
+
+    offsets = build_index(filename)
+    try:
+        with open(index_file, 'w', encoding='utf-8') as f:
+            json.dump({"version": INDEX_VERSION, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "offsets": offsets}, f)
+    except OSError:
+        pass  # e.g. read-only directory; the in-memory index still works
+    return offsets
+
+class JsonlIndex(Mapping):
+    """
+    Read-only, dict-like view of a .jsonl file keyed by task_id. Only the byte-offset
+    index is kept in memory; a record is parsed from disk when it is looked up.
+    Like building a dict from the file, the last record wins for a repeated task_id;
+    get_all() returns every record for the task.
+    """
+
+    def __init__(self, filename: str, cache_size: int = 256):
+        self.filename = filename
+        self._offsets = load_index(filename)
+        self._file = open(filename, 'rb')
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+
+    def _read_at(self, offset: int) -> dict:
+        self._file.seek(offset)
+        return loads(self._file.readline())
+
+    def __getitem__(self, task_id):
+        if task_id in self._cache:
+            self._cache.move_to_end(task_id)
+            return self._cache[task_id]
+        record = self._read_at(self._offsets[task_id][-1])
+        self._cache[task_id] = record
+        if len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+        return record
+
+    def get_all(self, task_id) -> list:
+        return [self._read_at(offset) for offset in self._offsets.get(task_id, [])]
+
+    def __contains__(self, task_id):
+        return task_id in self._offsets
+
+    def __iter__(self):
+        return iter(self._offsets)
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def load_jsonl(filename: str) -> JsonlIndex:
+    """
+    Opens a .jsonl file as a mapping keyed by task_id (records are read lazily).
+    The mapping holds the file open; close it, or use it as a context manager.
+    """
+    return JsonlIndex(filename)
+
+def repair_partial_line(filename: str) -> int:
+    """
+    Truncates a half-written last line left behind by an interrupted run.
+    Returns the number of bytes dropped.
+    """
+    if not os.path.exists(filename):
+        return 0
+    with open(filename, 'rb+') as f:
+        size = f.seek(0, os.SEEK_END)
+        end = size
+        # Walk back to the last newline in small blocks
+        while end > 0:
+            start = max(0, end - 4096)
+            f.seek(start)
+            block = f.read(end - start)
+            newline = block.rfind(b"\n")
+            if newline != -1:
+                end = start + newline + 1
+                break
+            end = start
+        if end < size:
+            f.truncate(end)
+            f.flush()
+            os.fsync(f.fileno())
+        return size - end
+
+def _completed_records(filename: str):
+    """Yields the records of an output .jsonl file, after dropping any half-written last line."""
+    if not os.path.exists(filename):
+        return
+    dropped = repair_partial_line(filename)
+    if dropped:
+        print(f"Dropped {dropped} bytes of a half-written line from {filename}")
+    with open(filename, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                record = loads(line)
+                record["task_id"]
+            except (ValueError, KeyError) as e:
+                print(f"Skipping bad line in {filename}: {e}")
+                continue
+            yield record
+
+def count_completed(filename: str) -> Counter:
+    """
+    Counts the records per task_id already present in an output .jsonl file,
+    after dropping any half-written last line.
+    """
+    return Counter(record["task_id"] for record in _completed_records(filename))
+
+def completed_samples(filename: str) -> dict:
+    """
+    Maps task_id -> set of sample indices already present in an output .jsonl file.
+    Records are matched by their "sample" field, so gaps left by a run that wrote
+    samples out of order are found. A record without one (written before the field
+    existed) takes the lowest index not yet used for its task.
+    """
+    done = {}
+    unnumbered = Counter()
+    for record in _completed_records(filename):
+        if "sample" in record:
+            done.setdefault(record["task_id"], set()).add(record["sample"])
+        else:
+            unnumbered[record["task_id"]] += 1
+    for task_id, count in unnumbered.items():
+        samples = done.setdefault(task_id, set())
+        index = 0
+        for _ in range(count):
+            while index in samples:
+                index += 1
+            samples.add(index)
+    return done
+
+class CheckpointWriter:
+    """
+    Writes JSONL records so an interrupted run loses at most the line being written:
+    every record goes straight to the file (unbuffered, retrying short writes until
+    the whole line is out) and the file is fsync'd every `checkpoint_every` records.
+    A line cut off by a crash is dropped by repair_partial_line() on resume.
+    """
+
+    def __init__(self, filename: str, append: bool = False, checkpoint_every: int = 1):
+        self._f = open(filename, 'ab' if append else 'wb', buffering=0)
+        self.checkpoint_every = max(1, checkpoint_every)
+        self._since_checkpoint = 0
+
+    def write(self, record: dict):
+        # A raw file may accept fewer bytes than asked for (e.g. on a signal or a full pipe)
+        data = memoryview(dumps_line(record))
+        while data:
+            data = data[self._f.write(data):]
+        self._since_checkpoint += 1
+        if self._since_checkpoint >= self.checkpoint_every:
+            self.checkpoint()
+
+    def checkpoint(self):
+        os.fsync(self._f.fileno())
+        self._since_checkpoint = 0
+
+    def close(self):
+        if not self._f.closed:
+            self.checkpoint()
+            self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
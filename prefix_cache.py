@@ -0,0 +1,154 @@
+"""
+Reuse of prompt key/value state across prompts that share a token prefix.
+
+Prompts built from one template share their instruction block (e.g. the "rim"
+prompt of generate_llm.py), HumanEval prompts often share their import lines, and
+several samples of one task share the whole prompt. PrefixCache keeps the KV state
+of recently prefilled prompts and prefills a new prompt only from the end of its
+longest cached prefix.
+
+Cached prompts are indexed by chained hashes of their BLOCK_TOKENS-token prefixes,
+so finding the longest shared prefix costs one dict lookup per block of the new
+prompt rather than a comparison with every cached prompt.
+"""
+from collections import OrderedDict
+
+import torch
+from transformers import DynamicCache
+
+# --- Configuration ---
+PREFIX_CACHE_BYTES = 1024 ** 3  # KV state kept for reuse (LRU); ~2000 prompt tokens of a 7B fp16 model
+BLOCK_TOKENS = 16               # prefixes are matched in whole blocks of this many tokens
+# ---------------------
+
+def common_prefix_length(a, b) -> int:
+    """Length of the longest common prefix of two token sequences."""
+    n = min(len(a), len(b))
+    for i in range(n):
+        if a[i] != b[i]:
+            return i
+    return n
+
+def block_hashes(ids) -> list:
+    """Chained hashes of ids[:BLOCK_TOKENS], ids[:2 * BLOCK_TOKENS], ... (whole blocks only)."""
+    hashes, h = [], None
+    for end in range(BLOCK_TOKENS, len(ids) + 1, BLOCK_TOKENS):
+        h = hash((h, tuple(ids[end - BLOCK_TOKENS:end])))
+        hashes.append(h)
+    return hashes
+
+def kv_bytes(kv) -> int:
+    """Memory held by a per-layer list of (keys, values) tensors."""
+    return sum(t.numel() * t.element_size() for layer in kv for t in layer)
+
+class PrefixCache:
+    """
+    LRU store of per-prompt KV caches for one model, bounded by the bytes they hold.
+    prefill() returns the same (cache, last logits) as a full forward pass over the
+    prompt, but only runs the model over the tokens after the longest cached prefix.
+    """
+
+    def __init__(self, model, max_bytes=PREFIX_CACHE_BYTES):
+        self.model = model
+        self.max_bytes = max_bytes
+        self.device = next(model.parameters()).device
+        self._entries = OrderedDict()  # token tuple -> (per layer (keys, values), block hashes, bytes)
+        self._index = {}               # block hash -> token tuples of the entries with that prefix
+        self._bytes = 0
+        self.reused_tokens = 0
+        self.computed_tokens = 0
+        self.evictions = 0
+
+    def _longest_match(self, ids, hashes):
+        """The cached prompt sharing the most leading tokens with ids, as (key, shared length)."""
+        for h in reversed(hashes):
+            candidates = self._index.get(h)
+            if candidates:
+                # Every candidate shares at least these blocks; pick the one that goes furthest
+                return max(((key, common_prefix_length(key, ids)) for key in candidates), key=lambda m: m[1])
+        return None, 0
+
+    def _remove(self, key):
+        _, hashes, size = self._entries.pop(key)
+        for h in hashes:
+            keys = self._index[h]
+            keys.discard(key)
+            if not keys:
+                del self._index[h]
+        self._bytes -= size
+
+    def _store(self, key, hashes, kv):
+        size = kv_bytes(kv)
+        if key in self._entries or size > self.max_bytes or not hashes:
+            return
+        # Cached prompts that are prefixes of this one are now redundant
+        for h in hashes:
+            for old in [old for old in self._index.get(h, ()) if len(old) < len(key) and key[:len(old)] == old]:
+                self._remove(old)
+        self._entries[key] = (kv, hashes, size)
+        for h in hashes:
+            self._index.setdefault(h, set()).add(key)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    @torch.inference_mode()
+    def prefill(self, ids):
+        """
+        Prefills one prompt (a list of token ids). Returns (kv, logits) where kv is a
+        per-layer list of (keys, values) of shape [1, heads, len(ids), head_dim] and
+        logits are the next-token logits after the last prompt token.
+        """
+        hashes = block_hashes(ids)
+        key, matched = self._longest_match(ids, hashes)
+        # At least the last token is always run, since its logits are needed
+        matched = min(matched, len(ids) - 1)
+        past = None
+        if matched:
+            self._entries.move_to_end(key)
+            past = DynamicCache([(k[:, :, :matched], v[:, :, :matched]) for k, v in self._entries[key][0]])
+
+        input_ids = torch.tensor([ids[matched:]], device=self.device)
+        out = self.model(input_ids=input_ids, past_key_values=past, use_cache=True)
+        kv = [(layer.keys, layer.values) for layer in out.past_key_values.layers]
+
+        self.reused_tokens += matched
+        self.computed_tokens += len(ids) - matched
+        self._store(tuple(ids), hashes, kv)
+        return kv, out.logits[0, -1]
+
+    def stats(self) -> dict:
+        total = self.reused_tokens + self.computed_tokens
+        return {
+            "prefill_tokens_reused": self.reused_tokens,
+            "prefill_tokens_computed": self.computed_tokens,
+            "prefill_reuse_rate": round(self.reused_tokens / total, 3) if total else 0.0,
+            "cached_prompts": len(self._entries),
+            "cached_bytes": self._bytes,
+            "evictions": self.evictions,
+        }
+
+def shared_prefill(model, input_ids, attention_mask, num_samples):
+    """
+    Prefills a left-padded batch of prompts once and repeats the resulting cache
+    num_samples times, so the samples of one prompt share its prefill instead of
+    each recomputing it. Everything but the last prompt token is prefilled; the
+    returned (input_ids, attention_mask, cache) go straight to model.generate().
+    """
+    position_ids = (attention_mask.cumsum(-1) - 1).clamp(min=0)
+    cache = DynamicCache()
+    with torch.inference_mode():
+        model(
+            input_ids=input_ids[:, :-1],
+            attention_mask=attention_mask[:, :-1],
+            position_ids=position_ids[:, :-1],
+            past_key_values=cache,
+            use_cache=True,
+        )
+    cache.batch_repeat_interleave(num_samples)
+    return (
+        input_ids.repeat_interleave(num_samples, dim=0),
+        attention_mask.repeat_interleave(num_samples, dim=0),
+        cache,
+    )
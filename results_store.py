@@ -0,0 +1,83 @@
+import hashlib
+import os
+import sqlite3
+import sys
+import time
+
+import coverage
+
+from coverage_engine import ENGINE_VERSION, work_unit_key
+
+# --- Configuration ---
+DEFAULT_STORE_PATH = ".cache/coverage_results.sqlite"
+# ---------------------
+
+def result_key(solution_code: str, test_asserts: str, extra_tests: tuple = ()) -> str:
+    """
+    Key for one stored coverage result: the code and tests it was measured with,
+    plus the Python, coverage.py and engine versions (any of them can change the numbers).
+    """
+    environment = f"python={sys.version}|coverage={coverage.__version__}|engine={ENGINE_VERSION}"
+    unit = work_unit_key(solution_code, test_asserts, extra_tests)
+    return hashlib.sha256(f"{unit}|{environment}".encode("utf-8")).hexdigest()
+
+class ResultsStore:
+    """
+    Persistent store of coverage results in a SQLite file, so unchanged
+    (solution, tests) cells are served from disk instead of being measured again.
+    """
+
+    def __init__(self, path: str = DEFAULT_STORE_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._db = sqlite3.connect(path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key TEXT PRIMARY KEY, passed INTEGER NOT NULL, line REAL NOT NULL, "
+            "branch REAL NOT NULL, missing TEXT NOT NULL, created REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    def get_many(self, keys) -> dict:
+        """Returns key -> (passed, line %, branch %, missing lines) for the keys that are stored."""
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        # Stay under SQLite's limit on the number of query parameters
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            rows = self._db.execute(
+                f"SELECT key, passed, line, branch, missing FROM results WHERE key IN ({','.join('?' * len(chunk))})",
+                chunk,
+            )
+            for key, passed, line, branch, missing in rows:
+                found[key] = (bool(passed), line, branch, missing)
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def get(self, key: str):
+        return self.get_many([key]).get(key)
+
+    def put_many(self, results: dict):
+        now = time.time()
+        self._db.executemany(
+            "INSERT OR REPLACE INTO results (key, passed, line, branch, missing, created) VALUES (?, ?, ?, ?, ?, ?)",
+            [(key, int(passed), line, branch, missing, now) for key, (passed, line, branch, missing) in results.items()],
+        )
+        self._db.commit()
+
+    def put(self, key: str, result: tuple):
+        self.put_many({key: result})
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,8 +1,11 @@
-import json
-import re
-import subprocess
 import os
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from code_extract import extract_final_code
+from jsonl_io import load_jsonl
+from coverage_engine import UNMEASURED, measure_isolated
+from forkserver import preload
+from results_store import DEFAULT_STORE_PATH, ResultsStore, result_key
 
 # --- Configuration ---
 # 1. ADD YOUR 4 JSONL FILENAMES HERE
@@ -14,105 +17,77 @@ COMPLETION_FILES_TO_TEST = [
 ]
 
 TASKS_FILE = "tasks.jsonl"
-SOLUTION_FILENAME = "temp_solution.py"
-TEST_FILENAME = "temp_test.py"
-COVERAGE_JSON = "coverage.json"
+MAX_WORKERS = os.cpu_count() or 1  # tasks measured in parallel
+RESULTS_STORE = DEFAULT_STORE_PATH  # set to None to always recompute
+TIMEOUT_SECONDS = 30.0  # wall-clock limit per task; the child is killed after it
+CPU_SECONDS = 30        # CPU-time limit per task (RLIMIT_CPU)
 # ---------------------
 
-def load_jsonl(filename: str) -> dict:
-    """Loads a .jsonl file and returns a dictionary keyed by task_id."""
-    data = {}
-    with open(filename, 'r', encoding='utf-8') as f:
-        for line in f:
-            try:
-                item = json.loads(line)
-                data[item['task_id']] = item
-            except json.JSONDecodeError as e:
-                print(f"Skipping bad line in {filename}: {e}")
-    return data
-
-def extract_final_code(completion_text: str) -> str:
+def build_matrix(tasks: dict) -> tuple:
     """
-    Extracts the *last* Python code block from the completion string.
+    Builds the (completion file x task) matrix.
+    Returns (cells, units): cells is the ordered list of (file, task_id, unit key) and
+    units maps each unit key to one (solution_code, test_asserts) to measure.
+    Identical solutions with identical tests share a single unit.
     """
-    code_blocks = re.findall(r"```(python|Python)\n(.*?)```", completion_text, re.DOTALL)
-    if code_blocks:
-        return code_blocks[-1][1]
-    code_blocks = re.findall(r"```\n(.*?)\n```", completion_text, re.DOTALL)
-    if code_blocks:
-        return code_blocks[-1]
-    if "def " in completion_text and "```" not in completion_text:
-        return completion_text
-    print(f"Warning: Could not extract code from completion text: {completion_text[:50]}...")
-    return ""
-
-def create_test_file(solution_code: str, test_asserts: str):
-    """
-    Creates a runnable test file and the solution file it imports.
-    """
-    with open(SOLUTION_FILENAME, 'w', encoding='utf-8') as f:
-        f.write(solution_code)
+    cells = []
+    units = {}
 
-    test_lines = test_asserts.strip().split('\n')
-    indented_asserts = "\n".join([f"    {line}" for line in test_lines])
-    
-    test_file_content = f"""
-from {SOLUTION_FILENAME.replace('.py', '')} import *
-{os.linesep.join([line for line in solution_code.split(os.linesep) if line.startswith('import ')])}
+    # --- Outer loop for each completion file ---
+    for completion_filename in COMPLETION_FILES_TO_TEST:
+        print(f"\n--- Processing File: {completion_filename} ---")
+        try:
+            completions = load_jsonl(completion_filename)
+        except FileNotFoundError:
+            print(f"Warning: Could not find file {completion_filename}. Skipping.")
+            continue
+            
+        with completions:
+            if not completions:
+                print(f"Warning: No completions found in {completion_filename}. Skipping.")
+                continue
+
+            # --- Inner loop for each problem in the file ---
+            for task_id, completion_item in completions.items():
+                if task_id not in tasks:
+                    print(f"Skipping {task_id}: No matching task found in {TASKS_FILE}.")
+                    continue
+            
+                solution_code = extract_final_code(completion_item['completion'])
+                if not solution_code:
+                    print(f"Skipping {task_id}: Could not extract solution code.")
+                    continue
+                
+                test_asserts = tasks[task_id]['test']
+                key = result_key(solution_code, test_asserts)
+                units.setdefault(key, (solution_code, test_asserts))
+                cells.append((completion_filename, task_id, key))
 
-def test_main():
-{indented_asserts}
-"""
-    with open(TEST_FILENAME, 'w', encoding='utf-8') as f:
-        f.write(test_file_content)
+    return cells, units
 
-def run_tests_and_coverage() -> tuple:
+def run_units(units: dict) -> dict:
     """
-    Runs pytest with coverage, parses the JSON report, and returns results.
+    Measures every unique unit across the worker pool. Returns unit key -> result.
+    Units already in the results store are served from it; only new ones are measured.
     """
-    result = subprocess.run(
-        [
-            "pytest",
-            f"--cov={SOLUTION_FILENAME.replace('.py', '')}",
-            f"--cov-report=json:{COVERAGE_JSON}",
-            TEST_FILENAME
-        ],
-        capture_output=True,
-        text=True
-    )
-    
-    tests_passed = result.returncode == 0
-    line_coverage = 0.0
-    branch_coverage = 0.0
-    
-    try:
-        with open(COVERAGE_JSON, 'r') as f:
-            cov_data = json.load(f)
-        totals = cov_data.get("totals", {})
-        if totals.get("num_statements", 0) > 0:
-            line_coverage = totals.get("percent_covered", 0.0)
-        if totals.get("num_branches", 0) > 0:
-            branch_coverage = totals.get("percent_covered_branches", 0.0)
-        else:
-            branch_coverage = 100.0
-    except (FileNotFoundError, json.JSONDecodeError):
-        if tests_passed:
-            with open(SOLUTION_FILENAME, 'r') as sf:
-                if not sf.read().strip():
-                    line_coverage = 100.0
-                    branch_coverage = 100.0
-
-    return tests_passed, round(line_coverage, 1), round(branch_coverage, 1)
-
-def cleanup_files():
-    """Removes temporary files."""
-    for f in [SOLUTION_FILENAME, TEST_FILENAME, COVERAGE_JSON, ".pytest_cache"]:
-        if os.path.exists(f):
-            if os.path.isdir(f):
-                import shutil
-                shutil.rmtree(f)
-            else:
-                os.remove(f)
+    store = ResultsStore(RESULTS_STORE) if RESULTS_STORE else None
+    results = store.get_many(units) if store else {}
+    keys = [key for key in units if key not in results]
+    print(f"{len(results)} unit(s) served from the results store, {len(keys)} to measure.")
+
+    if keys:
+        with ProcessPoolExecutor(max_workers=MAX_WORKERS, initializer=preload) as pool:
+            futures = [pool.submit(measure_isolated, *units[key], timeout=TIMEOUT_SECONDS, cpu_seconds=CPU_SECONDS)
+                       for key in keys]
+            measured = {key: future.result() for key, future in zip(keys, futures)}
+        if store:
+            # Timeouts and crashes are not stored, so they are measured again next run
+            store.put_many({key: result for key, result in measured.items() if result is not None})
+        results.update({key: result or UNMEASURED for key, result in measured.items()})
+
+    if store:
+        store.close()
+    return results
 
 def main():
     print("Loading tasks...")
@@ -124,52 +99,27 @@ def main():
         
     all_report_data = []
 
-    # --- Outer loop for each completion file ---
-    for completion_filename in COMPLETION_FILES_TO_TEST:
-        print(f"\n--- Processing File: {completion_filename} ---")
-        try:
-            completions = load_jsonl(completion_filename)
-        except FileNotFoundError:
-            print(f"Warning: Could not find file {completion_filename}. Skipping.")
-            continue
-            
-        if not completions:
-            print(f"Warning: No completions found in {completion_filename}. Skipping.")
-            continue
+    with tasks:
+        cells, units = build_matrix(tasks)
+    print(f"\nMeasuring {len(units)} unique solution(s) for {len(cells)} (file, task) cell(s)...")
+    results = run_units(units)
 
-        # --- Inner loop for each problem in the file ---
-        for task_id, completion_item in completions.items():
-            if task_id not in tasks:
-                print(f"Skipping {task_id}: No matching task found in {TASKS_FILE}.")
-                continue
-            
-            task_item = tasks[task_id]
-            
-            solution_code = extract_final_code(completion_item['completion'])
-            if not solution_code:
-                print(f"Skipping {task_id}: Could not extract solution code.")
-                continue
-                
-            test_asserts = task_item['test']
-            create_test_file(solution_code, test_asserts)
-            
-            passed, line_cov, branch_cov = run_tests_and_coverage()
-            
-            # Add the result to our master list
-            all_report_data.append({
-                "Source File": completion_filename, # <-- NEW COLUMN
-                "Problem": task_id,
-                "Tests Passed": "All" if passed else "FAIL",
-                "Line %": line_cov,
-                "Branch %": branch_cov,
-            })
-            
-            print(f"  Processed {task_id}: Passed={passed}, Line={line_cov}%, Branch={branch_cov}%")
+    # Fan each unit's result back out to every cell that uses it, in matrix order
+    for completion_filename, task_id, key in cells:
+        passed, line_cov, branch_cov, _ = results[key]
+        
+        # Add the result to our master list
+        all_report_data.append({
+            "Source File": completion_filename, # <-- NEW COLUMN
+            "Problem": task_id,
+            "Tests Passed": "All" if passed else "FAIL",
+            "Line %": line_cov,
+            "Branch %": branch_cov,
+        })
+        
+        print(f"  Processed {completion_filename} {task_id}: Passed={passed}, Line={line_cov}%, Branch={branch_cov}%")
 
-    # 5. Clean up temporary files
-    cleanup_files()
-    
-    # 6. Generate final report
+    # 5. Generate final report
     if not all_report_data:
         print("No results to report. Did you update COMPLETION_FILES_TO_TEST?")
         return
@@ -1,4 +1,28 @@
 import re
+from functools import lru_cache
+
+_NON_WORD = re.compile(r'[^\w]')
+_PALINDROME_CHUNK = 1 << 16
+
+# For ASCII text, lower-casing and dropping non-word characters (anything but
+# letters, digits and "_") is a single bytes.translate call.
+_ASCII_LOWER = bytes.maketrans(b"ABCDEFGHIJKLMNOPQRSTUVWXYZ", b"abcdefghijklmnopqrstuvwxyz")
+_ASCII_NON_WORD = bytes(c for c in range(128) if not (chr(c).isalnum() or c == ord("_")))
+
+def _is_mirrored(t) -> bool:
+    """
+    Two-pointer comparison of t with its reverse, one chunk from each end at a
+    time, so a mismatch near the ends is found without reversing the whole text.
+    """
+    n = len(t)
+    if n <= _PALINDROME_CHUNK:
+        return t == t[::-1]
+    half = n // 2
+    for i in range(0, half, _PALINDROME_CHUNK):
+        j = min(i + _PALINDROME_CHUNK, half)
+        if t[i:j] != t[n - j:n - i][::-1]:
+            return False
+    return True
 
 def is_palindrome(s: str) -> bool:
     """
@@ -6,25 +30,83 @@ def is_palindrome(s: str) -> bool:
     """
     if not isinstance(s, str):
         return False
+    if type(s) is str and s.isascii():
+        return _is_mirrored(s.encode("ascii").translate(_ASCII_LOWER, _ASCII_NON_WORD))
+    # Unicode lower-casing can change lengths and \w covers far more than ASCII,
+    # so other text keeps the original normalization
     s = s.lower().replace(" ", "")
-    s = re.sub(r'[^\w]', '', s)
-    return s == s[::-1]
+    s = _NON_WORD.sub('', s)
+    return _is_mirrored(s)
 
-def fib(n: int) -> int:
-    """
-    Calculates the n-th Fibonacci number.
-    """
+def is_palindrome_many(strings) -> list:
+    """Checks every item of an iterable of strings; returns one bool per item, in order."""
+    return [is_palindrome(s) for s in strings]
+
+FIB_MEMO_SIZE = 128     # results kept by fib(n, memo=True)
+_FIB_STEP_LIMIT = 16    # fib_many walks gaps up to this size with plain additions
+
+def _check_fib_input(n):
     if not isinstance(n, int):
         raise ValueError("Input must be a non-negative integer")
     if n < 0:
         raise ValueError("Input cannot be negative")
-        
-    if n == 0:
-        return 0
-    if n == 1:
-        return 1
-    
+
+def _fib_pair(n: int) -> tuple:
+    """
+    Returns (F(n), F(n + 1)) by fast doubling, O(log n) big-integer multiplications:
+    F(2k) = F(k) * (2 * F(k + 1) - F(k)) and F(2k + 1) = F(k)^2 + F(k + 1)^2.
+    """
     a, b = 0, 1
-    for _ in range(2, n + 1):
-        a, b = b, a + b
-    return b
\ No newline at end of file
+    for bit in bin(n)[2:]:
+        c = a * (2 * b - a)
+        d = a * a + b * b
+        if bit == "1":
+            a, b = d, c + d
+        else:
+            a, b = c, d
+    return a, b
+
+@lru_cache(maxsize=FIB_MEMO_SIZE)
+def _fib_memo(n: int) -> int:
+    return _fib_pair(n)[0]
+
+def fib(n: int, memo: bool = False) -> int:
+    """
+    Calculates the n-th Fibonacci number.
+    With memo=True, results are kept in a bounded LRU cache for repeated queries.
+    """
+    _check_fib_input(n)
+    if memo:
+        return _fib_memo(int(n))
+    return _fib_pair(n)[0]
+
+def fib_many(ns) -> list:
+    """
+    Calculates fib(n) for every n in ns, in order, in one pass.
+    Indices are visited in increasing order and each result is reached from the
+    previous one (F(m + k) from F(m) and F(k)), so the doubling steps are shared.
+    Raises like fib() on the first invalid input.
+    """
+    ns = list(ns)
+    for n in ns:
+        _check_fib_input(n)
+
+    results = {}
+    m, pair = 0, (0, 1)  # pair = (F(m), F(m + 1))
+    for n in sorted(set(ns)):
+        gap = n - m
+        if gap <= _FIB_STEP_LIMIT:
+            a, b = pair
+            for _ in range(gap):
+                a, b = b, a + b
+            pair = (a, b)
+        else:
+            fm, fm1 = pair
+            fk, fk1 = _fib_pair(gap)
+            # F(m + k) = F(m) F(k + 1) + F(m + 1) F(k) - F(m) F(k)
+            # F(m + k + 1) = F(m + 1) F(k + 1) + F(m) F(k)
+            fmk = fm * fk
+            pair = (fm * fk1 + fm1 * fk - fmk, fm1 * fk1 + fmk)
+        m = n
+        results[n] = pair[0]
+    return [results[n] for n in ns]
@@ -0,0 +1,109 @@
+"""
+Early stopping for code generation.
+
+Most of what a model writes after the closing ``` fence of its function is
+discarded by extract_final_code anyway. FunctionCompleteCriteria watches every
+sequence while it is decoded and stops it as soon as it has produced a closed
+code block that parses and defines the target function.
+"""
+import ast
+from typing import Optional
+
+import torch
+from transformers import StoppingCriteria
+
+from code_extract import find_code_blocks
+
+# Blocks with these info strings are checked ("" is a bare ``` fence)
+_CODE_TAGS = {"", "python", "python3", "py"}
+
+_FUNCTIONS = (ast.FunctionDef, ast.AsyncFunctionDef)
+
+def target_function(task: dict) -> Optional[str]:
+    """
+    Name of the function a task asks for, taken from its canonical solution:
+    its first top-level function, or its first class if it only defines classes.
+    """
+    try:
+        tree = ast.parse(task.get("canonical_solution", ""))
+    except SyntaxError:
+        return None
+    for node in tree.body:
+        if isinstance(node, _FUNCTIONS):
+            return node.name
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef):
+            return node.name
+    return None
+
+def _defines(tree: ast.Module, target: Optional[str]) -> bool:
+    """
+    True if the module defines `target` where the tests can reach it: as a top-level
+    function, a top-level class, or a method of a top-level class (e.g. Solution.twoSum).
+    A function nested inside another function does not count.
+    """
+    for node in tree.body:
+        if isinstance(node, _FUNCTIONS) and target in (None, node.name):
+            return True
+        if isinstance(node, ast.ClassDef) and target is not None:
+            if node.name == target or any(isinstance(item, _FUNCTIONS) and item.name == target for item in node.body):
+                return True
+    return False
+
+def completes_function(text: str, target: Optional[str] = None) -> bool:
+    """
+    True once text contains a closed code block that is valid Python and defines
+    `target` (any top-level function if target is None); see _defines.
+    """
+    for block in find_code_blocks(text):
+        if block.language not in _CODE_TAGS:
+            continue
+        try:
+            tree = ast.parse(block.code)
+        except SyntaxError:
+            continue
+        if _defines(tree, target):
+            return True
+    return False
+
+class FunctionCompleteCriteria(StoppingCriteria):
+    """
+    Per-sequence stopping criterion for model.generate / text-generation pipelines.
+    `targets` gives the function name for each row of the batch (or one name, or
+    None for any function). A row is only re-checked when its newest token contains
+    a backtick, since that is the only way a closing fence can appear.
+    Rows stop independently; tokens_saved counts the max_new_tokens budget they
+    did not use.
+    """
+
+    def __init__(self, tokenizer, max_new_tokens: int, targets=None):
+        self.tokenizer = tokenizer
+        self.max_new_tokens = max_new_tokens
+        self.targets = targets
+        self.prompt_length = None
+        self.stopped_after = {}  # row -> number of new tokens when it stopped
+        self._done = None
+
+    def _target(self, row: int) -> Optional[str]:
+        if isinstance(self.targets, (list, tuple)):
+            return self.targets[row]
+        return self.targets
+
+    def __call__(self, input_ids: torch.LongTensor, scores, **kwargs) -> torch.BoolTensor:
+        if self._done is None:
+            # The first call comes right after the first new token is appended
+            self.prompt_length = input_ids.shape[1] - 1
+            self._done = torch.zeros(input_ids.shape[0], dtype=torch.bool, device=input_ids.device)
+        new_tokens = input_ids.shape[1] - self.prompt_length
+        for row in range(input_ids.shape[0]):
+            if self._done[row] or "`" not in self.tokenizer.decode(input_ids[row, -1:]):
+                continue
+            text = self.tokenizer.decode(input_ids[row, self.prompt_length:], skip_special_tokens=True)
+            if completes_function(text, self._target(row)):
+                self._done[row] = True
+                self.stopped_after[row] = new_tokens
+        return self._done.clone()
+
+    @property
+    def tokens_saved(self) -> int:
+        return sum(self.max_new_tokens - n for n in self.stopped_after.values())
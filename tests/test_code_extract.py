@@ -0,0 +1,82 @@
+import pytest
+from code_extract import CodeBlock, extract_code, find_code_blocks
+
+COMPLETION = (
+    "First try:\n"
+    "```python\ndef add(a, b):\n    return a - b\n```\n"
+    "Helper:\n"
+    "```python\ndef helper():\n    return [i for i in range(10)]\n```\n"
+    "A shell command:\n"
+    "```bash\npython add.py\n```\n"
+    "Fixed:\n"
+    "```python\ndef add(a, b):\n    return a + b\n```\n"
+    "Done."
+)
+
+# ==============================================================================
+# find_code_blocks: fence pairing
+# ==============================================================================
+
+def test_blocks_are_found_in_order_with_their_language():
+    blocks = find_code_blocks(COMPLETION)
+    assert [b.language for b in blocks] == ["python", "python", "bash", "python"]
+    assert blocks[0] == CodeBlock("python", "def add(a, b):\n    return a - b\n", COMPLETION.index("```python"))
+
+def test_python_fence_reopens_an_open_block():
+    # A stray bare fence in front of the real code would otherwise swallow it
+    text = "Here:\n```\nstray\n```python\ndef f():\n    return 1\n```\n"
+    assert find_code_blocks(text) == [CodeBlock("python", "def f():\n    return 1\n", text.index("```python"))]
+    text = "```python\na = 1\n```python\nb = 2\n```"
+    assert [b.code for b in find_code_blocks(text)] == ["b = 2\n"]
+
+def test_fence_must_be_followed_by_a_newline_to_open():
+    text = "Use ```python def f(): pass``` inline.\n```python\nx = 1\n```"
+    assert [b.code for b in find_code_blocks(text)] == ["x = 1\n"]
+
+def test_unclosed_block_is_dropped():
+    assert find_code_blocks("```python\ndef f():\n    return 1\n") == []
+
+# ==============================================================================
+# extract_code: policies and fallbacks
+# ==============================================================================
+
+@pytest.mark.parametrize("policy, expected", [
+    ("first", "def add(a, b):\n    return a - b\n"),
+    ("last", "def add(a, b):\n    return a + b\n"),
+    ("longest", "def helper():\n    return [i for i in range(10)]\n"),
+])
+def test_policies(policy, expected):
+    assert extract_code(COMPLETION, policy=policy) == expected
+
+def test_def_policy_picks_the_last_block_defining_the_target():
+    text = "```python\ndef f():\n    return 1\n```\n```python\nprint(f())\n```"
+    assert extract_code(text, policy="def", target="f") == "def f():\n    return 1\n"
+    assert extract_code(COMPLETION, policy="def", target="helper").startswith("def helper")
+
+def test_def_policy_falls_back_to_last():
+    assert extract_code(COMPLETION, policy="def", target="missing") == extract_code(COMPLETION, policy="last")
+    assert extract_code(COMPLETION, policy="def") == extract_code(COMPLETION, policy="last")
+
+def test_bare_blocks_only_without_python_blocks():
+    assert extract_code("```\nx = 1\n```\n```python\ny = 2\n```") == "y = 2\n"
+    assert extract_code("```\nx = 1\n```\n```bash\nls\n```") == "x = 1\n"
+    assert extract_code("```bash\nls\n```", fallback=None) == ""
+
+@pytest.mark.parametrize("text, fallback, expected", [
+    ("def f():\n    return 1", "def", "def f():\n    return 1"),
+    ("def f():\n    return 1\n```", "def", ""),
+    ("no code here", "def", ""),
+    ("no code here", "raw", "no code here"),
+    ("def f():\n    return 1", None, ""),
+])
+def test_fallbacks(text, fallback, expected):
+    assert extract_code(text, fallback=fallback) == expected
+
+def test_unknown_policy():
+    with pytest.raises(ValueError, match="Unknown extraction policy"):
+        extract_code(COMPLETION, policy="best")
+
+def test_clean_results_skips_a_stray_fence():
+    # clean_results.py takes the first block; the stray bare fence no longer hides the code
+    text = "I'll fix it.\n```\n\nHere is the code:\n```python\ndef f():\n    return 1\n```\nThat's it."
+    assert extract_code(text, policy="first", fallback="raw") == "def f():\n    return 1\n"
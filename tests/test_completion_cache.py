@@ -0,0 +1,64 @@
+import itertools
+
+import pytest
+from completion_cache import CompletionCache, cache_key
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    # A strictly increasing clock, so LRU order never depends on timer resolution
+    clock = itertools.count(1)
+    monkeypatch.setattr("completion_cache.time.time", lambda: float(next(clock)))
+    cache = CompletionCache(str(tmp_path / "cache" / "completions.sqlite"), max_bytes=10)
+    yield cache
+    cache.close()
+
+def test_evicts_least_recently_used(cache):
+    cache.put("a", "aaaa")
+    cache.put("b", "bbbb")
+    assert cache.get("a") == "aaaa"  # a is now more recent than b
+    cache.put("c", "cccc")
+    assert cache.get("b") is None
+    assert cache.get("a") == "aaaa" and cache.get("c") == "cccc"
+    assert cache.stats()["bytes"] == 8
+
+def test_replacing_a_key_counts_its_bytes_once(cache):
+    cache.put("a", "aaaa")
+    cache.put("b", "bbbb")
+    cache.put("a", "é")  # 2 bytes of UTF-8
+    assert cache.stats()["bytes"] == 6 and cache.stats()["entries"] == 2
+    cache.put("c", "cccc")
+    # 10 bytes fit exactly, so nothing is evicted
+    assert [cache.get(key) for key in "abc"] == ["é", "bbbb", "cccc"]
+
+def test_oversized_entry_empties_the_cache(cache):
+    cache.put("a", "aaaa")
+    cache.put("big", "x" * 11)
+    assert cache.stats()["entries"] == 0 and cache.stats()["bytes"] == 0
+
+def test_hit_and_miss_counters(cache):
+    cache.put("a", "aaaa")
+    cache.get("a")
+    cache.get("a")
+    cache.get("missing")
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (2, 1, 0.667)
+
+def test_byte_count_survives_reopening(cache):
+    cache.put("a", "aaaa")
+    cache.put("b", "bb")
+    reopened = CompletionCache(cache.path, max_bytes=10)
+    assert reopened.stats()["bytes"] == 6
+    reopened.close()
+
+def test_cache_key_depends_on_every_input():
+    base = cache_key("m", "hf", "prompt", {"temperature": 0.2}, seed=1, sample=0)
+    assert base == cache_key("m", "hf", "prompt", {"temperature": 0.2}, seed=1, sample=0)
+    variants = [
+        cache_key("m2", "hf", "prompt", {"temperature": 0.2}, seed=1, sample=0),
+        cache_key("m", "server", "prompt", {"temperature": 0.2}, seed=1, sample=0),
+        cache_key("m", "hf", "prompt2", {"temperature": 0.2}, seed=1, sample=0),
+        cache_key("m", "hf", "prompt", {"temperature": 0.8}, seed=1, sample=0),
+        cache_key("m", "hf", "prompt", {"temperature": 0.2}, seed=2, sample=0),
+        cache_key("m", "hf", "prompt", {"temperature": 0.2}, seed=1, sample=1),
+    ]
+    assert len({base, *variants}) == 7
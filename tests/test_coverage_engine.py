@@ -0,0 +1,36 @@
+from coverage_engine import measure_in_workspace
+
+SOLUTION = (
+    "def sign(x):\n"
+    "    if x > 0:\n"
+    "        return 1\n"
+    "    if x < 0:\n"
+    "        return -1\n"
+    "    return 0\n"
+)
+
+EXTRA_TESTS = '''
+import pytest
+from temp_solution import sign
+
+@pytest.fixture
+def zero():
+    return 0
+
+@pytest.mark.parametrize("x, expected", [(5, 1), (-5, -1)])
+def test_sign(x, expected):
+    assert sign(x) == expected
+
+class TestZero:
+    def test_zero(self, zero):
+        assert sign(zero) == 0
+'''
+
+def test_extra_tests_run_under_pytest():
+    passed, line, branch, missing = measure_in_workspace(SOLUTION, "assert sign(3) == 1", (("test_sign.py", EXTRA_TESTS),))
+    assert (passed, line, branch, missing) == (True, 100.0, 100.0, "")
+
+def test_failing_extra_test_fails_the_run():
+    failing = EXTRA_TESTS.replace("(-5, -1)", "(-5, 1)")
+    passed, line, _, _ = measure_in_workspace(SOLUTION, "assert sign(3) == 1", (("test_sign.py", failing),))
+    assert passed is False and line == 100.0
@@ -0,0 +1,58 @@
+from differential import DifferentialTester, _run_calls, generate_inputs, parse_signature, same_result
+from evaluate import SandboxPool
+
+TASK = {
+    "task_id": "HumanEval/45",
+    "canonical_solution": (
+        "def mean_absolute_deviation(lst: list[float]) -> float:\n"
+        "    if not lst: return 0\n"
+        "    m = sum(lst) / len(lst)\n"
+        "    return sum(abs(x - m) for x in lst) / len(lst)\n"
+    ),
+    "test": "assert mean_absolute_deviation([1,2,3,4])==1.0\nassert mean_absolute_deviation([])==0",
+}
+
+def test_same_result_rules():
+    assert same_result(0.1 + 0.2, 0.3)
+    assert same_result(float("nan"), float("nan"))
+    assert same_result(3, 3.0)
+    assert not same_result(1, True)
+    assert not same_result([1, 2], (1, 2))
+    assert same_result({"a": [1.0]}, {"a": [1.0 + 1e-12]})
+    assert not same_result("1", 1)
+
+def test_inputs_follow_signature_and_seed():
+    signature = parse_signature(TASK["canonical_solution"])
+    assert signature.name == "mean_absolute_deviation"
+    inputs = generate_inputs(TASK, signature, 200, seed=3)
+    assert inputs == generate_inputs(TASK, signature, 200, seed=3)
+    assert all(len(args) == 1 and isinstance(args[0], list) for args in inputs)
+    assert all(isinstance(x, float) for args in inputs for x in args[0])
+    assert ([],) in inputs
+
+def test_reports_first_divergence_and_reuses_oracle():
+    wrong = TASK["canonical_solution"].replace("    if not lst: return 0\n", "")
+    items = [(TASK, TASK["canonical_solution"]), (TASK, wrong), (TASK, "def mean_absolute_deviation(lst):\n    return (")]
+    with SandboxPool(workers=1, timeout=5, runner=_run_calls) as pool:
+        tester = DifferentialTester(pool, num_inputs=120, batch_size=50)
+        reports = tester.check(items)
+        oracle_runs = len(tester._oracle)
+        tester.check(items[:1])
+        assert len(tester._oracle) == oracle_runs == 3
+
+    assert reports[0] == {"task_id": "HumanEval/45", "status": "agree", "inputs_checked": 120}
+    assert reports[1]["status"] == "diverged"
+    assert reports[1]["first_divergence"] == {"input": "([],)", "expected": "0", "actual": "raises ZeroDivisionError"}
+    assert reports[2]["status"] == "error"
+
+def test_broken_oracle_is_not_agreement():
+    looping = dict(TASK, task_id="loop", canonical_solution="def f(x: int) -> int:\n    while True:\n        pass\n")
+    missing = dict(TASK, task_id="missing", canonical_solution="import not_a_module\ndef f(x: int) -> int:\n    return x\n")
+    wrong = "def f(x):\n    return -1\n"
+    with SandboxPool(workers=1, timeout=1, runner=_run_calls) as pool:
+        reports = DifferentialTester(pool, num_inputs=10, batch_size=10).check([(looping, wrong), (missing, wrong)])
+
+    assert [r["status"] for r in reports] == ["oracle_error", "oracle_error"]
+    assert all(r["inputs_checked"] == 0 for r in reports)
+    assert reports[0]["error"].startswith("timeout")
+    assert "not_a_module" in reports[1]["error"]
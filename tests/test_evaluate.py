@@ -0,0 +1,65 @@
+import json
+import math
+import signal
+
+from evaluate import SandboxPool, _outcome_for_exit, _run_sample, compute_passk, estimate_pass_at_k, evaluate_model
+from forkserver import MEMORY_EXIT_CODE
+
+def test_only_reported_memory_errors_count_as_memory_exceeded():
+    assert _outcome_for_exit(MEMORY_EXIT_CODE)[0] == "memory_exceeded"
+    assert _outcome_for_exit(-signal.SIGKILL) == ("crashed", "Worker was killed by signal 9")
+    assert _outcome_for_exit(-signal.SIGSEGV)[0] == "crashed"
+    assert _outcome_for_exit(-signal.SIGXCPU)[0] == "timeout"
+    assert _outcome_for_exit(1) == ("failed", "Worker exited with code 1")
+
+def test_killed_sample_is_a_crash():
+    jobs = [("import os, signal\nos.kill(os.getpid(), signal.SIGKILL)", "pass"), ("x = 1", "assert x == 1")]
+    with SandboxPool(workers=1, timeout=5) as pool:
+        outcomes = pool.map(jobs)
+    assert outcomes == [("crashed", "Worker was killed by signal 9"), ("passed", None)]
+
+def test_samples_run_as_written():
+    # A completion that forgets an import fails; nothing is injected for it
+    assert _run_sample("def f(x):\n    return math.sqrt(x)", "assert f(4) == 2") == ("failed", "name 'math' is not defined")
+    assert _run_sample("def f(x):\n    import math\n    return math.sqrt(x)", "assert f(4) == 2") == ("passed", None)
+
+def write_jsonl(path, records):
+    path.write_text("".join(json.dumps(r) + "\n" for r in records))
+    return str(path)
+
+def test_evaluate_model_report(tmp_path):
+    tasks = write_jsonl(tmp_path / "tasks.jsonl", [
+        {"task_id": "T/0", "test": "assert add(1, 2) == 3"},
+        {"task_id": "T/1", "test": "assert neg(1) == -1"},
+    ])
+    generated = write_jsonl(tmp_path / "generated.jsonl", [
+        {"task_id": "T/0", "completion": "def add(a, b):\n    return a + b"},
+        {"task_id": "T/1", "completion": "def neg(x):\n    return x"},
+        {"task_id": "T/0", "completion": "def add(a, b):\n    return a - b"},
+        {"task_id": "T/1", "completion": "def neg(x):\n    return -x"},
+    ])
+    report_file = tmp_path / "report.json"
+    evaluate_model(generated, tasks, str(report_file), k_values=[1, 2], timeout=5)
+    report = json.loads(report_file.read_text())
+    assert report["metrics"] == {"pass@1": 0.5, "pass@2": 1.0}
+    assert report["per_task"]["T/1"] == {"n": 2, "correct": 1, "pass@1": 0.5, "pass@2": 1.0}
+    assert [r["status"] for r in report["results"]] == ["passed", "failed", "failed", "passed"]
+
+def test_pass_at_k_matches_the_binomial_formula():
+    n, c = [10, 10, 5, 3], [0, 3, 5, 1]
+    expected = [1 - math.comb(ni - ci, 2) / math.comb(ni, 2) for ni, ci in zip(n, c)]
+    assert [round(x, 12) for x in estimate_pass_at_k(n, c, 2)] == [round(x, 12) for x in expected]
+
+def test_pass_at_k_with_no_results():
+    assert estimate_pass_at_k([], [], 1).shape == (0,)
+    assert compute_passk([], k=1) is None
+    assert compute_passk([{"task_id": "T/0", "passed": True}], k=1) == 1.0
+
+def test_evaluate_model_with_no_completions(tmp_path, capsys):
+    tasks = write_jsonl(tmp_path / "tasks.jsonl", [{"task_id": "T/0", "test": "assert True"}])
+    generated = write_jsonl(tmp_path / "generated.jsonl", [])
+    report_file = tmp_path / "report.json"
+    evaluate_model(generated, tasks, str(report_file), k_values=[1, 5], timeout=5)
+    # Undefined pass@k values are left out of the metrics instead of being reported as 0.0
+    assert json.loads(report_file.read_text()) == {"metrics": {}, "per_task": {}, "results": []}
+    assert "Skipping pass@5" in capsys.readouterr().out
@@ -0,0 +1,108 @@
+import random
+import re
+
+import pytest
+from src.solutions import fib, fib_many, is_palindrome, is_palindrome_many
+
+# ==============================================================================
+# Reference implementations (the original straightforward versions)
+# ==============================================================================
+
+def reference_is_palindrome(s):
+    if not isinstance(s, str):
+        return False
+    s = s.lower().replace(" ", "")
+    s = re.sub(r'[^\w]', '', s)
+    return s == s[::-1]
+
+def reference_fib(n):
+    if n == 0:
+        return 0
+    a, b = 0, 1
+    for _ in range(2, n + 1):
+        a, b = b, a + b
+    return b
+
+# ==============================================================================
+# fib: fast doubling, memo and batch API
+# ==============================================================================
+
+def test_fib_matches_reference():
+    for n in range(1000):
+        assert fib(n) == reference_fib(n)
+    assert fib(5000) == reference_fib(5000)
+
+def test_fib_memo_matches_reference():
+    for n in list(range(300)) + list(range(300)):
+        assert fib(n, memo=True) == reference_fib(n)
+
+def test_fib_accepts_bool_like_before():
+    # bool is an int subclass, so the original loop accepted it
+    assert fib(True) == 1
+    assert fib(False) == 0
+    assert fib_many([True, False]) == [1, 0]
+
+def test_fib_many_matches_reference():
+    rng = random.Random(0)
+    ns = [rng.randrange(20000) for _ in range(200)] + list(range(40)) + [0, 0, 7, 7]
+    rng.shuffle(ns)
+    assert fib_many(ns) == [reference_fib(n) for n in ns]
+    assert fib_many(iter(range(25))) == [reference_fib(n) for n in range(25)]
+    assert fib_many([]) == []
+
+@pytest.mark.parametrize("bad, message", [
+    (-1, "Input cannot be negative"),
+    (2.0, "Input must be a non-negative integer"),
+    ("3", "Input must be a non-negative integer"),
+    (None, "Input must be a non-negative integer"),
+])
+def test_fib_errors_unchanged(bad, message):
+    with pytest.raises(ValueError, match=message):
+        fib(bad)
+    with pytest.raises(ValueError, match=message):
+        fib(bad, memo=True)
+    with pytest.raises(ValueError, match=message):
+        fib_many([1, 2, bad])
+
+# ==============================================================================
+# is_palindrome: ASCII fast path, Unicode fallback and batch API
+# ==============================================================================
+
+# ASCII punctuation plus characters whose case mapping or \w membership is unusual
+ALPHABET = "aAbB zZ09_.,!'-\t\n" + "İıΣσςßẞÉéﬁ\u0301٣·€😀"
+
+def random_palindrome_candidate(rng):
+    half = "".join(rng.choice(ALPHABET) for _ in range(rng.randrange(12)))
+    text = half + rng.choice(["", rng.choice(ALPHABET)]) + half[::-1].swapcase()
+    if rng.random() < 0.5:
+        text = "".join(c if rng.random() < 0.9 else rng.choice(ALPHABET) for c in text)
+    return text
+
+def test_is_palindrome_matches_reference_fuzz():
+    rng = random.Random(0)
+    for _ in range(20000):
+        text = random_palindrome_candidate(rng)
+        assert is_palindrome(text) is reference_is_palindrome(text), repr(text)
+        ascii_text = text.encode("ascii", "ignore").decode()
+        assert is_palindrome(ascii_text) is reference_is_palindrome(ascii_text), repr(ascii_text)
+
+def test_is_palindrome_long_text():
+    half = "".join(random.Random(1).choice("Ab, c_9") for _ in range(50000))
+    text = half + half[::-1]
+    assert is_palindrome(text) is True
+    assert is_palindrome(text[:-1] + "x") is False
+    assert is_palindrome(half + "é" + half[::-1]) is True
+
+def test_is_palindrome_non_str_and_subclass():
+    class Text(str):
+        def lower(self):
+            return "not a palindrome"
+
+    for value in [None, 121, b"aba", ["a", "b", "a"]]:
+        assert is_palindrome(value) is False
+    assert is_palindrome(Text("aba")) is reference_is_palindrome(Text("aba"))
+
+def test_is_palindrome_many():
+    items = ["Race car", "Hello", "", None, "Σς", 12321]
+    assert is_palindrome_many(items) == [reference_is_palindrome(s) for s in items]
+    assert is_palindrome_many(iter(["aa", "ab"])) == [True, False]
@@ -0,0 +1,45 @@
+import os
+import time
+
+import pytest
+from coverage_engine import UNMEASURED, measure_isolated
+from forkserver import FORK_AVAILABLE, call_forked
+from results_store import ResultsStore
+
+pytestmark = pytest.mark.skipif(not FORK_AVAILABLE, reason="needs os.fork")
+
+def test_call_forked_returns_and_raises():
+    assert call_forked(pow, 2, 10, timeout=5) == 1024
+    with pytest.raises(ZeroDivisionError):
+        call_forked(divmod, 1, 0, timeout=5)
+
+def test_call_forked_kills_child_after_timeout():
+    start = time.monotonic()
+    with pytest.raises(TimeoutError):
+        call_forked(time.sleep, 30, timeout=0.5)
+    assert time.monotonic() - start < 5
+
+def test_call_forked_enforces_cpu_limit():
+    with pytest.raises(TimeoutError, match="CPU time"):
+        call_forked(exec, "while True: pass", timeout=30, cpu_seconds=1)
+
+def test_call_forked_reports_crash():
+    with pytest.raises(RuntimeError, match="crashed"):
+        call_forked(os._exit, 3, timeout=5)
+
+def test_measure_isolated_does_not_measure_a_looping_solution():
+    code = "def f():\n    while True:\n        pass\n"
+    assert measure_isolated(code, "f()", timeout=1) is None
+    assert measure_isolated("def f():\n    return 1\n", "assert f() == 1", timeout=10)[:3] == (True, 100.0, 100.0)
+
+def test_timed_out_units_are_not_stored(tmp_path, monkeypatch):
+    import run_all_coverage
+    monkeypatch.setattr(run_all_coverage, "RESULTS_STORE", str(tmp_path / "results.sqlite"))
+    monkeypatch.setattr(run_all_coverage, "TIMEOUT_SECONDS", 1)
+    monkeypatch.setattr(run_all_coverage, "MAX_WORKERS", 1)
+    units = {"loop": ("def f():\n    while True:\n        pass\n", "f()"),
+             "ok": ("def f():\n    return 1\n", "assert f() == 1")}
+    results = run_all_coverage.run_units(units)
+    assert results["loop"] == UNMEASURED and results["ok"][:3] == (True, 100.0, 100.0)
+    with ResultsStore(run_all_coverage.RESULTS_STORE) as store:
+        assert set(store.get_many(units)) == {"ok"}
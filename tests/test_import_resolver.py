@@ -0,0 +1,21 @@
+from import_resolver import inject_imports, missing_imports
+
+def test_only_allowlisted_names_are_resolved():
+    code = "x = sqrt(2) + math.pi\ny = os.getcwd()\nz = antigravity\nw = this\n"
+    assert missing_imports(code) == (("math", None), ("math", "sqrt"))
+
+def test_locals_and_parameters_are_not_missing():
+    assert missing_imports("def f(re, List):\n    return re.x, List\n") == ()
+    assert missing_imports("def f():\n    deque = []\n    return [deque for _ in deque]\n") == ()
+    # A parameter in one function does not hide a global use in another
+    code = "def f(re):\n    return re\ndef g(s):\n    return re.sub('a', 'b', s)\n"
+    assert missing_imports(code) == (("re", None),)
+
+def test_module_level_bindings_win():
+    assert missing_imports("from math import *\nsqrt = abs\nprint(sqrt(2))\n") == ()
+    assert missing_imports("def f():\n    global Counter\n    Counter = dict\ndef g():\n    return Counter()\n") == ()
+
+def test_injected_names_do_not_replace_existing_ones():
+    namespace = {"sqrt": abs}
+    inject_imports(namespace, "y = sqrt(4) + floor(1.5)\n")
+    assert namespace["sqrt"] is abs and namespace["floor"](1.5) == 1
@@ -0,0 +1,55 @@
+import pytest
+import torch
+from transformers import GPT2Config, GPT2LMHeadModel
+
+from inference_server import ContinuousBatcher
+
+class ByteTokenizer:
+    """One token per byte, so any prompt round-trips without a vocabulary file."""
+    eos_token_id = None
+
+    def __call__(self, text):
+        return {"input_ids": list(text.encode("latin-1"))}
+
+    def decode(self, ids, skip_special_tokens=False):
+        return bytes(ids).decode("latin-1")
+
+@pytest.fixture(scope="module")
+def model():
+    torch.manual_seed(0)
+    config = GPT2Config(vocab_size=256, n_positions=256, n_embd=64, n_layer=2, n_head=4)
+    return GPT2LMHeadModel(config).eval()
+
+def sequential_greedy(model, prompt, max_new_tokens):
+    input_ids = torch.tensor([ByteTokenizer()(prompt)["input_ids"]])
+    with torch.inference_mode():
+        output = model.generate(input_ids, attention_mask=torch.ones_like(input_ids), max_new_tokens=max_new_tokens,
+                                do_sample=False, pad_token_id=0)
+    return ByteTokenizer().decode(output[0, input_ids.shape[1]:].tolist())
+
+@pytest.mark.parametrize("prefix_cache_bytes", [0, 1 << 24])
+def test_batched_greedy_matches_sequential(model, prefix_cache_bytes):
+    # More requests than slots, with different prompt and output lengths, so sequences
+    # join and leave the running batch at different steps and the buffer has to grow
+    requests = [
+        ("def add(a, b):", 40), ("x", 5), ("def add(a, b):\n    return", 70),
+        ("# A much longer prompt that joins a batch of shorter ones\nimport os\n", 12),
+        ("# Another long prompt, longer than anything else still in the batch\n", 8),
+        ("class Stack:", 3), ("y = [", 90), ("def add(a, b):\n", 25),
+    ]
+    batcher = ContinuousBatcher(model, ByteTokenizer(), max_batch_size=3, prefix_cache_bytes=prefix_cache_bytes)
+    sequences = [batcher.submit(prompt, max_new_tokens=n, do_sample=False) for prompt, n in requests]
+    for seq in sequences:
+        assert seq.done.wait(timeout=60)
+        assert seq.error is None
+    for (prompt, n), seq in zip(requests, sequences):
+        assert seq.completion == sequential_greedy(model, prompt, n), prompt
+    assert batcher.metrics()["mean_batch_size"] > 1
+
+def test_seeded_sampling_is_reproducible(model):
+    batcher = ContinuousBatcher(model, ByteTokenizer(), max_batch_size=4, prefix_cache_bytes=0)
+    params = dict(max_new_tokens=20, temperature=1.0, do_sample=True)
+    first = batcher.generate("def f(x):", num_samples=3, seed=11, **params)
+    assert batcher.generate("def f(x):", num_samples=3, seed=11, **params) == first
+    assert len(set(first)) == 3  # each sample has its own seed
+    assert batcher.generate("def f(x):", num_samples=1, seed=12, **params) == first[1:2]
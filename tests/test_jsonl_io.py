@@ -0,0 +1,62 @@
+import io
+import json
+import os
+import subprocess
+import sys
+
+import jsonl_io
+import pytest
+from jsonl_io import CheckpointWriter, completed_samples, count_completed
+
+class ShortWriteFile(io.RawIOBase):
+    """A raw file that accepts at most three bytes per write() call."""
+
+    def __init__(self, path):
+        self._f = open(path, "wb", buffering=0)
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        return self._f.write(bytes(data[:3]))
+
+    def fileno(self):
+        return self._f.fileno()
+
+    def close(self):
+        self._f.close()
+        super().close()
+
+def test_checkpoint_writer_finishes_short_writes(tmp_path):
+    path = tmp_path / "out.jsonl"
+    records = [{"task_id": f"T/{i}", "completion": "def f():\n    return 'é'" * i} for i in range(5)]
+    with CheckpointWriter(str(path)) as writer:
+        writer._f.close()
+        writer._f = ShortWriteFile(path)
+        for record in records:
+            writer.write(record)
+    assert [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()] == records
+    assert sum(count_completed(str(path)).values()) == 5
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError, match="valid backends are: orjson, json"):
+        jsonl_io.use_backend("yaml")
+    env = dict(os.environ, JSONL_BACKEND="ujson")
+    result = subprocess.run([sys.executable, "-c", "import jsonl_io"], env=env, capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(jsonl_io.__file__)))
+    assert result.returncode != 0
+    assert "Unknown JSON backend 'ujson'; valid backends are: orjson, json" in result.stderr
+
+def test_backend_from_environment():
+    env = dict(os.environ, JSONL_BACKEND="json")
+    result = subprocess.run([sys.executable, "-c", "import jsonl_io; print(jsonl_io.BACKEND)"], env=env,
+                            capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(jsonl_io.__file__)))
+    assert result.stdout.strip() == "json"
+
+def test_completed_samples_finds_gaps(tmp_path):
+    path = tmp_path / "out.jsonl"
+    records = [{"task_id": "A", "sample": 2}, {"task_id": "A", "sample": 0}, {"task_id": "B"}, {"task_id": "B"},
+               {"task_id": "C", "sample": 0}, {"task_id": "C"}]
+    path.write_text("".join(json.dumps(r) + "\n" for r in records) + '{"task_id": "A", "sam')
+    assert completed_samples(str(path)) == {"A": {0, 2}, "B": {0, 1}, "C": {0, 1}}
+    assert completed_samples(str(tmp_path / "missing.jsonl")) == {}
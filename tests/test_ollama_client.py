@@ -0,0 +1,104 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from generate_llm import OllamaClient, run_eval
+
+# ==============================================================================
+# Local stand-in for the ollama /api/generate endpoint
+# ==============================================================================
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real server
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.connections.add(self.client_address)
+        self.server.options.append(body["options"])
+        with self.server.lock:
+            self.server.in_flight += 1
+            self.server.max_in_flight = max(self.server.max_in_flight, self.server.in_flight)
+        if self.server.barrier is not None:
+            # Hold each request until a second one arrives, so overlap does not depend on timing
+            self.server.barrier.wait()
+        # Stay in flight a little longer, so a request over the limit would be counted
+        time.sleep(self.server.delay)
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        events = [{"response": word + " ", "done": False} for word in body["prompt"].split()]
+        events.append({"response": "", "done": True})
+        for event in events:
+            data = (json.dumps(event) + "\n").encode()
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        # Leave the in-flight count before the client can see the end of the response
+        with self.server.lock:
+            self.server.in_flight -= 1
+        self.wfile.write(b"0\r\n\r\n")
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def fake_ollama():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeOllamaHandler)
+    server.lock = threading.Lock()
+    server.connections = set()
+    server.options = []
+    server.in_flight = 0
+    server.max_in_flight = 0
+    server.barrier = None
+    server.delay = 0.0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def test_streams_tokens_into_one_completion(fake_ollama):
+    client = OllamaClient("llama3", host=f"http://127.0.0.1:{fake_ollama.server_port}")
+    tokens = []
+    assert client.generate("def add ( a , b )", on_token=tokens.append) == "def add ( a , b )"
+    assert tokens[0] == "def "
+
+def test_reuses_keep_alive_connection(fake_ollama):
+    client = OllamaClient("llama3", host=f"http://127.0.0.1:{fake_ollama.server_port}")
+    for i in range(5):
+        assert client.generate(f"prompt {i}") == f"prompt {i}"
+    assert len(fake_ollama.connections) == 1
+
+def test_limits_concurrent_requests(fake_ollama):
+    fake_ollama.barrier = threading.Barrier(2, timeout=10)
+    fake_ollama.delay = 0.05
+    client = OllamaClient("llama3", host=f"http://127.0.0.1:{fake_ollama.server_port}", max_concurrency=2)
+    threads = [threading.Thread(target=client.generate, args=(f"p {i}",)) for i in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert fake_ollama.max_in_flight == 2
+
+def test_run_eval_forwards_one_seed_per_sample(fake_ollama, tmp_path):
+    tasks_file, output_file = tmp_path / "tasks.jsonl", tmp_path / "out.jsonl"
+    tasks_file.write_text("".join(json.dumps({"task_id": f"T/{i}", "prompt": f"task {i}"}) + "\n" for i in range(2)))
+    client = OllamaClient("llama3", host=f"http://127.0.0.1:{fake_ollama.server_port}", options={"temperature": 0.8})
+    run_eval(str(tasks_file), str(output_file), mode="cot", num_samples=3, generator=client, seed=7)
+    assert sorted(options["seed"] for options in fake_ollama.options) == [7, 7, 8, 8, 9, 9]
+    assert all(options["temperature"] == 0.8 for options in fake_ollama.options)
+    assert client.options == {"temperature": 0.8}
+
+def test_resume_fills_gaps_left_by_unordered_run(fake_ollama, tmp_path):
+    tasks_file, output_file = tmp_path / "tasks.jsonl", tmp_path / "out.jsonl"
+    tasks_file.write_text(json.dumps({"task_id": "T/0", "prompt": "task"}) + "\n")
+    # An ordered=False run that crashed after writing samples 2 and 0
+    output_file.write_text("".join(json.dumps({"task_id": "T/0", "sample": i, "completion": "x"}) + "\n" for i in (2, 0)))
+    client = OllamaClient("llama3", host=f"http://127.0.0.1:{fake_ollama.server_port}")
+    run_eval(str(tasks_file), str(output_file), mode="cot", num_samples=3, generator=client, seed=7,
+             ordered=False, resume=True)
+    assert [options["seed"] for options in fake_ollama.options] == [8]
+    records = [json.loads(line) for line in output_file.read_text().splitlines()]
+    assert sorted(r["sample"] for r in records) == [0, 1, 2]
@@ -0,0 +1,79 @@
+import pytest
+import torch
+from transformers import GPT2Config, GPT2LMHeadModel
+
+from prefix_cache import BLOCK_TOKENS, PrefixCache, kv_bytes, shared_prefill
+
+@pytest.fixture(scope="module")
+def model():
+    torch.manual_seed(0)
+    config = GPT2Config(vocab_size=100, n_positions=256, n_embd=32, n_layer=2, n_head=2, pad_token_id=0)
+    return GPT2LMHeadModel(config).eval()
+
+def full_prefill(model, ids):
+    with torch.inference_mode():
+        out = model(input_ids=torch.tensor([ids]), use_cache=True)
+    return [(layer.keys, layer.values) for layer in out.past_key_values.layers], out.logits[0, -1]
+
+def assert_same(result, expected):
+    (kv, logits), (expected_kv, expected_logits) = result, expected
+    assert torch.allclose(logits, expected_logits, atol=1e-5)
+    for (k, v), (ek, ev) in zip(kv, expected_kv):
+        assert torch.allclose(k, ek, atol=1e-5) and torch.allclose(v, ev, atol=1e-5)
+
+def test_hit_reuses_the_longest_cached_prefix(model):
+    cache = PrefixCache(model, max_bytes=1 << 24)
+    template = list(range(1, 3 * BLOCK_TOKENS + 5))
+    cache.prefill(template + [90, 91])
+    prompt = template + [80, 81, 82]
+    assert_same(cache.prefill(prompt), full_prefill(model, prompt))
+    # The whole shared prefix is reused, not just the whole blocks it was found by
+    assert cache.reused_tokens == len(template)
+    assert cache.computed_tokens == len(template) + 2 + 3
+
+    # The same prompt again: everything but the last token comes from the cache
+    assert_same(cache.prefill(prompt), full_prefill(model, prompt))
+    assert cache.reused_tokens == 2 * len(template) + 2
+
+def test_miss_runs_the_whole_prompt(model):
+    cache = PrefixCache(model, max_bytes=1 << 24)
+    cache.prefill(list(range(1, 40)))
+    prompt = [5] + list(range(1, 40))
+    assert_same(cache.prefill(prompt), full_prefill(model, prompt))
+    assert cache.reused_tokens == 0
+    # Sharing less than one block is not worth a lookup either
+    cache.prefill(list(range(1, BLOCK_TOKENS)) + [99] * 20)
+    assert cache.reused_tokens == 0
+
+def test_eviction_is_lru_and_bounded_by_bytes(model):
+    prompts = [[n] * (2 * BLOCK_TOKENS) for n in (1, 2, 3)]
+    entry_bytes = kv_bytes(full_prefill(model, prompts[0])[0])
+    cache = PrefixCache(model, max_bytes=2 * entry_bytes)
+    cache.prefill(prompts[0])
+    cache.prefill(prompts[1])
+    cache.prefill(prompts[0])      # touching prompt 0 makes prompt 1 the oldest
+    cache.prefill(prompts[2])
+    assert cache.stats()["evictions"] == 1 and cache.stats()["cached_bytes"] <= 2 * entry_bytes
+    reused = cache.reused_tokens
+    cache.prefill(prompts[0])
+    assert cache.reused_tokens == reused + len(prompts[0]) - 1
+    cache.prefill(prompts[1])
+    assert cache.reused_tokens == reused + len(prompts[0]) - 1  # prompt 1 was evicted
+
+def test_longer_prompt_replaces_its_cached_prefix(model):
+    cache = PrefixCache(model, max_bytes=1 << 24)
+    cache.prefill(list(range(1, 2 * BLOCK_TOKENS + 1)))
+    cache.prefill(list(range(1, 4 * BLOCK_TOKENS + 1)))
+    assert cache.stats()["cached_prompts"] == 1
+
+def test_shared_prefill_matches_unshared_generation(model):
+    # Two left-padded prompts of different lengths, three samples each
+    input_ids = torch.tensor([[0, 0, 0, 5, 6, 7, 8], [9, 8, 7, 6, 5, 4, 3]])
+    attention_mask = (input_ids != 0).long()
+    kwargs = dict(max_new_tokens=12, do_sample=False, pad_token_id=0)
+    with torch.inference_mode():
+        expected = model.generate(input_ids=input_ids.repeat_interleave(3, dim=0),
+                                  attention_mask=attention_mask.repeat_interleave(3, dim=0), **kwargs)
+        ids, mask, cache = shared_prefill(model, input_ids, attention_mask, 3)
+        shared = model.generate(input_ids=ids, attention_mask=mask, past_key_values=cache, **kwargs)
+    assert torch.equal(shared, expected)
@@ -0,0 +1,66 @@
+import generate_llm
+import pytest
+import torch
+from stopping import FunctionCompleteCriteria, completes_function, target_function
+
+def block(code):
+    return f"Here is the solution:\n```python\n{code}```\nIt works because"
+
+def test_top_level_function_and_decorators():
+    assert completes_function(block("def f(x):\n    return x\n"), "f")
+    assert completes_function(block("from functools import lru_cache\n@lru_cache(None)\ndef f(x):\n    return x\n"), "f")
+    assert completes_function(block("async def f():\n    return 1\n"), None)
+    assert not completes_function(block("def g(x):\n    return x\n"), "f")
+
+def test_nested_defs():
+    # A helper nested inside the target is fine; the target nested in another function is not reachable
+    assert completes_function(block("def f(xs):\n    def key(x):\n        return -x\n    return sorted(xs, key=key)\n"), "f")
+    assert not completes_function(block("def outer():\n    def f(x):\n        return x\n    return f\n"), "f")
+
+def test_class_method_target():
+    solution = "class Solution:\n    def twoSum(self, nums, target):\n        return [0, 1]\n"
+    assert completes_function(block(solution), "twoSum")
+    assert completes_function(block(solution), "Solution")
+    assert target_function({"canonical_solution": solution}) == "Solution"
+    assert target_function({"canonical_solution": "import math\ndef f():\n    pass\nclass A:\n    pass\n"}) == "f"
+
+def test_truncated_body_does_not_stop():
+    assert not completes_function("```python\ndef f(x):\n    return x\n", "f")  # fence not closed yet
+    assert not completes_function(block("def f(x):\n    if x:\n"), "f")
+    assert not completes_function(block("def f(x):\n    return (x +\n"), "f")
+    assert not completes_function("```text\ndef f(x):\n    return x\n```", "f")
+
+class CharTokenizer:
+    """One token per character, so tests can write the decoded text directly."""
+
+    def decode(self, ids, skip_special_tokens=False):
+        return "".join(chr(int(i)) for i in ids)
+
+def test_criteria_stops_rows_independently():
+    prompt = "Write f.\n"
+    answer = "Sure:\n```python\ndef f(x):\n    return x\n```"
+    rows = [answer + "\nand then some more text", "```python\ndef f(x):\n    while True:\n" + " " * 60]
+    width = max(map(len, rows))
+    ids = torch.tensor([[ord(c) for c in prompt + row.ljust(width)] for row in rows])
+    criteria = FunctionCompleteCriteria(CharTokenizer(), max_new_tokens=200, targets=["f", "f"])
+    done = None
+    for end in range(len(prompt) + 1, ids.shape[1] + 1):
+        done = criteria(ids[:, :end], None)
+    assert done.tolist() == [True, False]
+    assert criteria.stopped_after == {0: len(answer)}  # right at the closing fence
+    assert criteria.tokens_saved == 200 - criteria.stopped_after[0]
+
+def test_hf_generators_keep_their_own_early_stop(monkeypatch):
+    monkeypatch.setattr(generate_llm, "_HF_GENERATORS", {})
+    plain = generate_llm.get_hf_generator("tiny")
+    plain.pipe = object()  # stands in for a loaded pipeline
+    early = generate_llm.get_hf_generator("tiny", early_stop=True)
+    assert generate_llm.get_hf_generator("tiny") is plain
+    assert (plain.early_stop, early.early_stop) == (False, True)
+    assert early.pipe is plain.pipe and early._lock is plain._lock
+    assert "early_stop" in early.sampling_params and "early_stop" not in plain.sampling_params
+
+def test_early_stop_is_rejected_where_it_cannot_apply():
+    for backend in ("server", "ollama", "ollama-cli"):
+        with pytest.raises(ValueError, match="only supported by the hf backend"):
+            generate_llm.make_generator(backend, "model", early_stop=True)